@@ -323,3 +323,781 @@ def process_message(redis_client, message):
     wav_path = download_wav_file(redis_client, message)
     if not wav_path:
         return  # Skip to next message on download failure
+
+
+====================
+
+
+import os
+import sys
+import json
+import time
+import struct
+import socket
+import signal
+import sqlite3
+import hashlib
+import resource
+import tempfile
+import threading
+import subprocess
+import redis
+import boto3
+from botocore.config import Config
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dotenv import load_dotenv
+from pydub import AudioSegment
+
+# Load environment variables from a `.env` file
+load_dotenv()
+
+# Redis connection details from environment variables
+REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
+REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+REDIS_PASSWORD = os.getenv('REDIS_PASSWORD')
+
+# Redis stream names
+SOURCE_STREAM = "gwas-converter"
+TARGET_STREAM = "gwas-collector"
+
+# Converter service settings
+CONVERTER_GROUP = os.getenv('CONVERTER_GROUP', 'gwas-converter-workers')
+# The same name after a restart, so the startup replay finds this converter's pending messages
+CONVERTER_CONSUMER = os.getenv('CONVERTER_CONSUMER', socket.gethostname())
+CONVERTER_PROCESSES = int(os.getenv('CONVERTER_PROCESSES', os.cpu_count() or 1))
+# 'file' downloads to TMP_DIR and encodes with pydub on the process pool,
+# 'stream' pipes the S3 body through an encoder subprocess into a multipart upload
+TRANSCODE_MODE = os.getenv('TRANSCODE_MODE', 'file')
+# Messages in flight at once. In 'file' mode this is more than the process count so
+# downloads and uploads of the next files overlap with the encodes that are running;
+# in 'stream' mode every in-flight message runs its own encoder process.
+CONVERTER_IN_FLIGHT = int(os.getenv(
+    'CONVERTER_IN_FLIGHT', CONVERTER_PROCESSES if TRANSCODE_MODE == 'stream' else CONVERTER_PROCESSES * 2
+))
+# Encoder reading WAV on stdin and writing MP3 to stdout, e.g. "lame --silent - -"
+ENCODER_COMMAND = os.getenv(
+    'ENCODER_COMMAND', 'ffmpeg -hide_banner -loglevel error -f wav -i pipe:0 -f mp3 pipe:1'
+).split()
+STREAM_READ_CHUNK = int(os.getenv('STREAM_READ_CHUNK', 256 * 1024))
+# S3 requires every part but the last to be at least 5 MiB
+MULTIPART_PART_SIZE = max(int(os.getenv('MULTIPART_PART_SIZE', 8 * 1024 * 1024)), 5 * 1024 * 1024)
+CONVERTER_BLOCK_MS = int(os.getenv('CONVERTER_BLOCK_MS', 5000))
+# Read timeout while conversions are running, so finished ones are collected promptly
+CONVERTER_POLL_MS = int(os.getenv('CONVERTER_POLL_MS', 250))
+# Messages pending this long (failed here, or left by a dead converter) are claimed and retried
+CONVERTER_CLAIM_IDLE_MS = int(os.getenv('CONVERTER_CLAIM_IDLE_MS', 10 * 60 * 1000))
+# Claimed messages delivered more often than this (e.g. a file that is not a WAV)
+# are parked in the dead-letter stream and acknowledged
+CONVERTER_MAX_DELIVERIES = int(os.getenv('CONVERTER_MAX_DELIVERIES', 5))
+DEAD_LETTER_STREAM = os.getenv('CONVERTER_DEAD_LETTER_STREAM', 'gwas-converter-dead-letter')
+TMP_DIR = os.getenv('TMP_DIR', tempfile.gettempdir())
+
+# Encoder presets, chosen per recording from its WAV header. Sample rates and
+# channel counts are upper bounds: audio is never upsampled or upmixed.
+# ENCODER_PRESETS_FILE may point to a JSON object replacing these; ENCODER_PRESET
+# forces one preset for every recording.
+ENCODER_PRESETS = {
+    'speech-8k': {'channels': 1, 'sample_rate': 8000, 'bitrate': '8k'},
+    'speech-16k': {'channels': 1, 'sample_rate': 16000, 'bitrate': '24k'},
+    'speech-vbr': {'channels': 1, 'vbr_quality': 7},
+    'default': {'channels': 1, 'sample_rate': 22050, 'bitrate': '48k'},
+}
+if os.getenv('ENCODER_PRESETS_FILE'):
+    with open(os.getenv('ENCODER_PRESETS_FILE')) as presets_file:
+        ENCODER_PRESETS = json.load(presets_file)
+ENCODER_PRESET = os.getenv('ENCODER_PRESET')
+# Bytes fetched with a ranged GET to read the RIFF header
+WAV_PROBE_BYTES = int(os.getenv('WAV_PROBE_BYTES', 4096))
+
+# Conversion cache: source ETag + encoder settings -> existing MP3 ('redis', 'sqlite' or '' to disable)
+CONVERSION_CACHE = os.getenv('CONVERSION_CACHE', 'redis')
+CONVERSION_CACHE_KEY = "gwas-converter:conversions"
+# Cached conversions not used for this long expire; every hit restarts the clock
+CONVERSION_CACHE_TTL_SECONDS = int(os.getenv('CONVERSION_CACHE_TTL_SECONDS', 30 * 24 * 3600))
+CONVERSION_CACHE_STATS_KEY = "gwas-converter:conversion-stats"
+CONVERSION_CACHE_SQLITE_PATH = os.getenv('CONVERSION_CACHE_SQLITE_PATH', 'conversion_cache.db')
+
+running = True
+
+
+def stop(signum, frame):
+    """Signal handler that lets in-flight conversions finish before exiting."""
+    global running
+    running = False
+
+
+def get_redis_connection():
+    """Establish a connection to the Redis database."""
+    try:
+        r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD, decode_responses=True)
+        r.ping()
+        return r
+    except redis.ConnectionError as e:
+        print(f"Error connecting to Redis: {e}")
+        raise
+
+
+def get_s3_client(max_connections=CONVERTER_IN_FLIGHT * 2):
+    """Get a thread-safe S3 client with enough pooled connections for every in-flight message."""
+    return boto3.client('s3', config=Config(max_pool_connections=max_connections))
+
+
+def parse_s3_path(s3_path):
+    """Split 's3://bucket/key' (or 'bucket/key') into (bucket, key)."""
+    bucket, _, key = s3_path.replace('s3://', '', 1).partition('/')
+    return bucket, key
+
+
+def ensure_consumer_group(redis_conn, stream_name, group_name):
+    """Create the consumer group (and the stream) if it does not exist yet."""
+    try:
+        redis_conn.xgroup_create(stream_name, group_name, id='0', mkstream=True)
+    except redis.exceptions.ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+def parse_wav_chunks(buffer, buffer_start, offset, info):
+    """
+    Walk RIFF chunks in `buffer` (which holds the object bytes starting at
+    `buffer_start`) from `offset`, filling `info` from the 'fmt ' and 'data'
+    chunk headers.
+
+    Returns:
+        None once the 'data' chunk header was read, otherwise the object
+        offset where parsing has to continue with more bytes.
+    """
+    while offset + 8 <= buffer_start + len(buffer):
+        position = offset - buffer_start
+        chunk_id = buffer[position:position + 4]
+        chunk_size = struct.unpack('<I', buffer[position + 4:position + 8])[0]
+        if chunk_id == b'fmt ':
+            if position + 24 > len(buffer):
+                return offset
+            audio_format, channels, sample_rate, byte_rate, block_align, bits_per_sample = struct.unpack(
+                '<HHIIHH', buffer[position + 8:position + 24]
+            )
+            info.update(audio_format=audio_format, channels=channels, sample_rate=sample_rate,
+                        byte_rate=byte_rate, block_align=block_align, bits_per_sample=bits_per_sample)
+        elif chunk_id == b'data':
+            info['data_offset'] = offset + 8
+            info['data_bytes'] = chunk_size
+            return None
+        offset += 8 + chunk_size + (chunk_size & 1)
+    return offset
+
+
+def probe_wav_header(s3_client, bucket, key, probe_bytes=WAV_PROBE_BYTES):
+    """
+    Read a WAV file's format from its RIFF header with ranged GETs of the first
+    few KB, without downloading or decoding the audio.
+
+    Returns:
+        A dictionary with audio_format, channels, sample_rate, byte_rate,
+        block_align, bits_per_sample, data_offset, data_bytes, plus the
+        object's total bytes and etag.
+    """
+    response = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{probe_bytes - 1}")
+    header = response['Body'].read()
+    total_bytes = int(response['ContentRange'].rsplit('/', 1)[1]) if 'ContentRange' in response else len(header)
+    if header[:4] not in (b'RIFF', b'RF64') or header[8:12] != b'WAVE':
+        raise ValueError(f"s3://{bucket}/{key} is not a RIFF/WAVE file")
+
+    info = {'bytes': total_bytes, 'etag': response['ETag'].strip('"')}
+    resume = parse_wav_chunks(header, 0, 12, info)
+    # Large LIST/metadata chunks can push 'data' past the first read; skip over them
+    for _ in range(4):
+        if resume is None or resume >= total_bytes:
+            break
+        response = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={resume}-{resume + probe_bytes - 1}")
+        resume = parse_wav_chunks(response['Body'].read(), resume, resume, info)
+
+    if 'sample_rate' not in info or 'data_offset' not in info:
+        raise ValueError(f"Could not find the fmt and data chunks of s3://{bucket}/{key}")
+    # Streamed and RF64 files carry a placeholder data size; the rest of the object is audio
+    if info['data_bytes'] in (0, 0xFFFFFFFF) or info['data_offset'] + info['data_bytes'] > total_bytes:
+        info['data_bytes'] = total_bytes - info['data_offset']
+    return info
+
+
+def wav_metadata(wav_info):
+    """
+    Summarize a probed WAV header for downstream stages.
+
+    Returns:
+        A dictionary with duration_ms, sample_rate, channels and bytes.
+    """
+    # byte_rate is sample_rate * block_align; derive it when a writer left it empty
+    byte_rate = wav_info['byte_rate'] or wav_info['sample_rate'] * wav_info['block_align']
+    return {
+        'duration_ms': wav_info['data_bytes'] * 1000 // byte_rate if byte_rate else 0,
+        'sample_rate': wav_info['sample_rate'],
+        'channels': wav_info['channels'],
+        'bytes': wav_info['bytes'],
+    }
+
+
+def validate_presets(presets=None, forced=None):
+    """
+    Check the preset table and ENCODER_PRESET once at startup, so a typo
+    fails with a clear message instead of a KeyError on the first recording.
+
+    Raises:
+        ValueError: naming the unknown preset or the invalid setting.
+    """
+    presets = ENCODER_PRESETS if presets is None else presets
+    forced = ENCODER_PRESET if forced is None else forced
+    if not isinstance(presets, dict):
+        raise ValueError("the presets must be a JSON object of name -> settings")
+    if forced:
+        if forced not in presets:
+            raise ValueError(f"ENCODER_PRESET={forced!r} is not one of {sorted(presets)}")
+    else:
+        missing = [name for name in ('speech-8k', 'speech-16k', 'default') if name not in presets]
+        if missing:
+            raise ValueError(f"presets {missing} are needed unless ENCODER_PRESET is set")
+    for name, preset in presets.items():
+        if not isinstance(preset, dict):
+            raise ValueError(f"preset {name!r} must be an object")
+        unknown = set(preset) - {'channels', 'sample_rate', 'bitrate', 'vbr_quality'}
+        if unknown:
+            raise ValueError(f"preset {name!r} has unknown settings {sorted(unknown)}")
+
+
+def select_preset(wav_info):
+    """
+    Pick the encoder preset for a recording and cap it to the source format.
+
+    Returns:
+        A tuple (preset name, effective preset settings).
+    """
+    if ENCODER_PRESET:
+        name = ENCODER_PRESET
+    elif wav_info['sample_rate'] <= 8000:
+        name = 'speech-8k'
+    elif wav_info['sample_rate'] <= 16000:
+        name = 'speech-16k'
+    else:
+        name = 'default'
+    preset = dict(ENCODER_PRESETS[name])
+    if preset.get('sample_rate'):
+        preset['sample_rate'] = min(preset['sample_rate'], wav_info['sample_rate'])
+    if preset.get('channels'):
+        preset['channels'] = min(preset['channels'], wav_info['channels'])
+    return name, preset
+
+
+def encoder_arguments(preset, encoder='ffmpeg'):
+    """Translate a preset into ffmpeg (or lame) command-line options."""
+    if encoder == 'lame':
+        arguments = []
+        if preset.get('channels') == 1:
+            arguments += ['-a', '-m', 'm']
+        if preset.get('sample_rate'):
+            arguments += ['--resample', f"{preset['sample_rate'] / 1000:g}"]
+        if 'vbr_quality' in preset:
+            arguments += ['-V', str(preset['vbr_quality'])]
+        elif preset.get('bitrate'):
+            arguments += ['-b', preset['bitrate'].rstrip('k')]
+        return arguments
+
+    arguments = []
+    if preset.get('channels'):
+        arguments += ['-ac', str(preset['channels'])]
+    if preset.get('sample_rate'):
+        arguments += ['-ar', str(preset['sample_rate'])]
+    if 'vbr_quality' in preset:
+        arguments += ['-q:a', str(preset['vbr_quality'])]
+    elif preset.get('bitrate'):
+        arguments += ['-b:a', preset['bitrate']]
+    return arguments
+
+
+def build_encoder_command(preset, encoder_command=ENCODER_COMMAND):
+    """Insert the preset options before the output argument of the encoder command."""
+    encoder = 'lame' if os.path.basename(encoder_command[0]) == 'lame' else 'ffmpeg'
+    if encoder == 'lame':
+        # lame takes its options before the input and output arguments
+        return encoder_command[:1] + encoder_arguments(preset, encoder) + encoder_command[1:]
+    return encoder_command[:-1] + encoder_arguments(preset, encoder) + encoder_command[-1:]
+
+
+def encoder_settings(preset):
+    """Describe the encoder settings used for a preset; a change invalidates cached conversions."""
+    preset_description = ','.join(f"{name}={value}" for name, value in sorted(preset.items()))
+    if TRANSCODE_MODE == 'stream':
+        return f"stream:{' '.join(ENCODER_COMMAND)}:{preset_description}"
+    return f"pydub:mp3:{preset_description}"
+
+
+class RedisConversionCache:
+    """
+    Maps a source ETag plus encoder settings to an MP3 already produced for it,
+    shared by every converter through one Redis key per conversion. Keys
+    expire after ttl_seconds without a hit, so the cache does not grow with
+    every recording ever converted.
+    """
+
+    def __init__(self, redis_conn, key=CONVERSION_CACHE_KEY, ttl_seconds=CONVERSION_CACHE_TTL_SECONDS):
+        self.redis_conn = redis_conn
+        self.key = key
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, cache_key):
+        """Return (mp3_path, cpu_seconds) for a cached conversion, or None."""
+        value = self.redis_conn.getex(f"{self.key}:{cache_key}", ex=self.ttl_seconds)
+        if not value:
+            return None
+        mp3_path, _, cpu_seconds = value.rpartition('|')
+        return mp3_path, float(cpu_seconds)
+
+    def put(self, cache_key, mp3_path, cpu_seconds):
+        """Remember the MP3 produced for cache_key and the CPU time it took."""
+        self.redis_conn.set(f"{self.key}:{cache_key}", f"{mp3_path}|{cpu_seconds:.3f}", ex=self.ttl_seconds)
+
+
+class SQLiteConversionCache:
+    """
+    Same as RedisConversionCache, kept in a local SQLite file for a single host.
+    """
+
+    def __init__(self, path=CONVERSION_CACHE_SQLITE_PATH):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversions "
+                "(cache_key TEXT PRIMARY KEY, mp3_path TEXT NOT NULL, cpu_seconds REAL NOT NULL)"
+            )
+
+    def get(self, cache_key):
+        """Return (mp3_path, cpu_seconds) for a cached conversion, or None."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT mp3_path, cpu_seconds FROM conversions WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+
+    def put(self, cache_key, mp3_path, cpu_seconds):
+        """Remember the MP3 produced for cache_key and the CPU time it took."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO conversions (cache_key, mp3_path, cpu_seconds) VALUES (?, ?, ?)",
+                (cache_key, mp3_path, cpu_seconds),
+            )
+
+
+class ConversionStats:
+    """
+    Thread-safe hit/miss and CPU-seconds-saved counters. Totals are also added
+    to a Redis hash so the numbers of every converter can be read in one place.
+    """
+
+    def __init__(self, redis_conn, key=CONVERSION_CACHE_STATS_KEY):
+        self.redis_conn = redis_conn
+        self.key = key
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.cpu_seconds_saved = 0.0
+        self.cpu_seconds_spent = 0.0
+
+    def record(self, hit, cpu_seconds):
+        """Count one lookup; cpu_seconds is the encode time saved (hit) or spent (miss)."""
+        with self.lock:
+            if hit:
+                self.hits += 1
+                self.cpu_seconds_saved += cpu_seconds
+            else:
+                self.misses += 1
+                self.cpu_seconds_spent += cpu_seconds
+        pipeline = self.redis_conn.pipeline(transaction=False)
+        pipeline.hincrby(self.key, 'hits' if hit else 'misses', 1)
+        pipeline.hincrbyfloat(self.key, 'cpu_seconds_saved' if hit else 'cpu_seconds_spent', cpu_seconds)
+        pipeline.execute()
+
+    def summary(self):
+        """Return a one-line description of the counters."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            hit_rate = self.hits / lookups if lookups else 0.0
+            return (f"cache hits {self.hits}/{lookups} ({hit_rate:.1%}), "
+                    f"CPU saved {self.cpu_seconds_saved:.1f} s, CPU spent {self.cpu_seconds_spent:.1f} s")
+
+
+def convert_wav_to_mp3(wav_path, mp3_path, preset=None):
+    """
+    Convert a .wav file to .mp3 format with an encoder preset (pydub defaults
+    when None). Runs in a worker process of the pool, so it must stay a
+    module-level function.
+
+    Returns:
+        The CPU seconds used, including the ffmpeg child pydub runs. A pool
+        worker runs one task at a time, so the child usage delta is this task's.
+    """
+    cpu_started = time.process_time()
+    children_started = resource.getrusage(resource.RUSAGE_CHILDREN)
+    audio = AudioSegment.from_wav(wav_path)
+    preset = preset or {}
+    if preset.get('channels'):
+        audio = audio.set_channels(preset['channels'])
+    if preset.get('sample_rate'):
+        audio = audio.set_frame_rate(preset['sample_rate'])
+    if 'vbr_quality' in preset:
+        audio.export(mp3_path, format="mp3", parameters=['-q:a', str(preset['vbr_quality'])])
+    else:
+        audio.export(mp3_path, format="mp3", bitrate=preset.get('bitrate'))
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (time.process_time() - cpu_started
+            + children.ru_utime - children_started.ru_utime
+            + children.ru_stime - children_started.ru_stime)
+
+
+def wait_with_rusage(proc):
+    """
+    Wait for a subprocess and return the CPU seconds it used, which
+    Popen.wait() does not report.
+    """
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return usage.ru_utime + usage.ru_stime
+
+
+def feed_encoder(body, stdin, errors):
+    """
+    Copy the S3 body into the encoder's stdin in STREAM_READ_CHUNK pieces.
+    Runs on its own thread so reading the encoder's stdout never deadlocks.
+
+    A failed S3 read is appended to `errors` for the caller to raise: the
+    encoder only sees its stdin close and would exit 0 on the truncated audio.
+    """
+    try:
+        for chunk in body.iter_chunks(STREAM_READ_CHUNK):
+            stdin.write(chunk)
+    except BrokenPipeError:
+        pass  # the encoder exited early; its return code reports the error
+    except Exception as e:
+        errors.append(e)
+    finally:
+        body.close()
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def stream_transcode(s3_client, src_bucket, src_key, dst_bucket, dst_key, encoder_command=ENCODER_COMMAND):
+    """
+    Transcode an S3 object without touching the local disk.
+
+    The get_object body is piped into the encoder's stdin and the encoder's
+    stdout is uploaded as an S3 multipart upload, one MULTIPART_PART_SIZE
+    part at a time. Memory use is bounded by one part plus the pipe buffers,
+    whatever the size of the recording.
+
+    Returns:
+        A tuple (bytes uploaded, encoder CPU seconds).
+    """
+    body = s3_client.get_object(Bucket=src_bucket, Key=src_key)['Body']
+    upload_id = s3_client.create_multipart_upload(Bucket=dst_bucket, Key=dst_key, ContentType='audio/mpeg')['UploadId']
+
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(encoder_command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr)
+        feed_errors = []
+        feeder = threading.Thread(target=feed_encoder, args=(body, proc.stdin, feed_errors), daemon=True)
+        feeder.start()
+        try:
+            parts = []
+            uploaded = 0
+            while True:
+                part = proc.stdout.read(MULTIPART_PART_SIZE)
+                if not part and parts:
+                    break
+                response = s3_client.upload_part(
+                    Bucket=dst_bucket, Key=dst_key, UploadId=upload_id, PartNumber=len(parts) + 1, Body=part
+                )
+                parts.append({'PartNumber': len(parts) + 1, 'ETag': response['ETag']})
+                uploaded += len(part)
+                if len(part) < MULTIPART_PART_SIZE:
+                    break
+
+            feeder.join()
+            cpu_seconds = wait_with_rusage(proc)
+            if feed_errors:
+                raise RuntimeError(f"Reading s3://{src_bucket}/{src_key} failed: {feed_errors[0]}") from feed_errors[0]
+            if proc.returncode != 0:
+                stderr.seek(0)
+                raise RuntimeError(f"Encoder exited with {proc.returncode}: {stderr.read().decode(errors='replace')}")
+
+            s3_client.complete_multipart_upload(
+                Bucket=dst_bucket, Key=dst_key, UploadId=upload_id, MultipartUpload={'Parts': parts}
+            )
+            return uploaded, cpu_seconds
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            s3_client.abort_multipart_upload(Bucket=dst_bucket, Key=dst_key, UploadId=upload_id)
+            raise
+
+
+def mp3_exists(s3_client, mp3_path):
+    """Check that a cached MP3 object is still there."""
+    bucket, key = parse_s3_path(mp3_path)
+    try:
+        s3_client.head_object(Bucket=bucket, Key=key)
+        return True
+    except s3_client.exceptions.ClientError:
+        return False
+
+
+def handle_message(redis_conn, s3_client, process_pool, message_id, fields, cache=None, stats=None):
+    """
+    Download, convert and upload one recording, then publish the result and
+    acknowledge the message.
+
+    Runs on an I/O thread. In 'file' mode the encode itself is handed to the
+    process pool, so the thread only waits on it while other threads keep
+    downloading and uploading; in 'stream' mode it runs stream_transcode.
+    The message is acknowledged in the same MULTI/EXEC as the gwas-collector
+    write, and only after the MP3 upload finished; on any failure it stays
+    pending and is delivered again.
+
+    With a cache, a recording whose ETag was already converted with the same
+    encoder settings is not downloaded or encoded again: the existing MP3
+    path is published instead.
+
+    The duration, sample rate, channel count and size read from the WAV
+    header are added to the gwas-collector record, so later stages can
+    schedule work by duration without fetching the audio.
+    """
+    s3_path = fields.get('s3-file-path') or fields.get('s3_path') if fields else None
+    if not s3_path:
+        print(f"Message {message_id} has no s3-file-path, acknowledging without conversion: {fields}")
+        redis_conn.xack(SOURCE_STREAM, CONVERTER_GROUP, message_id)
+        return
+
+    bucket, key = parse_s3_path(s3_path)
+    mp3_key = os.path.splitext(key)[0] + '.mp3'
+    mp3_path = f"s3://{bucket}/{mp3_key}"
+
+    # One small ranged GET gives the format for the preset and the ETag for the cache
+    wav_info = probe_wav_header(s3_client, bucket, key)
+    _, preset = select_preset(wav_info)
+    metadata = wav_metadata(wav_info)
+
+    cache_key = None
+    if cache is not None:
+        cache_key = hashlib.sha1(f"{wav_info['etag']}|{encoder_settings(preset)}".encode('utf-8')).hexdigest()
+        cached = cache.get(cache_key)
+        if cached is not None and mp3_exists(s3_client, cached[0]):
+            if stats is not None:
+                stats.record(True, cached[1])
+            publish_result(redis_conn, message_id, fields, cached[0], s3_path, metadata)
+            return
+
+    if TRANSCODE_MODE == 'stream':
+        _, cpu_seconds = stream_transcode(s3_client, bucket, key, bucket, mp3_key, build_encoder_command(preset))
+    else:
+        # Message IDs keep temp names unique when two messages carry the same filename
+        local_wav_path = os.path.join(TMP_DIR, f"{message_id}-{os.path.basename(key)}")
+        local_mp3_path = os.path.splitext(local_wav_path)[0] + '.mp3'
+        try:
+            s3_client.download_file(bucket, key, local_wav_path)
+            cpu_seconds = process_pool.submit(convert_wav_to_mp3, local_wav_path, local_mp3_path, preset).result()
+            s3_client.upload_file(local_mp3_path, bucket, mp3_key)
+        finally:
+            for path in (local_wav_path, local_mp3_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    if cache is not None:
+        cache.put(cache_key, mp3_path, cpu_seconds)
+    if stats is not None:
+        stats.record(False, cpu_seconds)
+    publish_result(redis_conn, message_id, fields, mp3_path, s3_path, metadata)
+
+
+def publish_result(redis_conn, message_id, fields, mp3_path, s3_path, metadata=None):
+    """Write the converted record to gwas-collector and acknowledge the source message atomically."""
+    pipeline = redis_conn.pipeline(transaction=True)
+    pipeline.xadd(TARGET_STREAM, {**fields, **(metadata or {}), 'mp3_path': mp3_path, 'original_wav': s3_path})
+    pipeline.xack(SOURCE_STREAM, CONVERTER_GROUP, message_id)
+    pipeline.execute()
+
+
+def dead_letter(redis_conn, message_id, fields, error):
+    """Park a message that keeps failing in the dead-letter stream and acknowledge it atomically."""
+    pipeline = redis_conn.pipeline(transaction=True)
+    pipeline.xadd(DEAD_LETTER_STREAM, {'message_id': message_id, 'fields': json.dumps(fields), 'error': error})
+    pipeline.xack(SOURCE_STREAM, CONVERTER_GROUP, message_id)
+    pipeline.execute()
+
+
+def delivery_counts(redis_conn, messages):
+    """
+    Look up how often each claimed message was delivered.
+
+    Returns:
+        A dict of message ID to delivery count, from XPENDING.
+    """
+    if not messages:
+        return {}
+    pending = redis_conn.xpending_range(SOURCE_STREAM, CONVERTER_GROUP, min=messages[0][0], max=messages[-1][0],
+                                        count=len(messages), consumername=CONVERTER_CONSUMER)
+    return {entry['message_id']: entry['times_delivered'] for entry in pending}
+
+
+def run_converter(redis_conn, s3_client, cache=None):
+    """
+    Read gwas-converter through the consumer group and keep up to
+    CONVERTER_IN_FLIGHT messages moving through download, encode and upload.
+
+    Messages that failed stay pending. Every CONVERTER_CLAIM_IDLE_MS the
+    pending entries idle for that long, whether this converter's or a dead
+    one's, are claimed with XAUTOCLAIM and converted again, unless they were
+    delivered more than CONVERTER_MAX_DELIVERIES times: those go to the
+    dead-letter stream with their last error.
+    """
+    ensure_consumer_group(redis_conn, SOURCE_STREAM, CONVERTER_GROUP)
+    stats = ConversionStats(redis_conn)
+    converted = 0
+    reported = 0
+    started = time.perf_counter()
+
+    # 'stream' mode encodes in subprocesses of the I/O threads and needs no process pool
+    with (ProcessPoolExecutor(max_workers=CONVERTER_PROCESSES) if TRANSCODE_MODE != 'stream'
+          else nullcontext()) as process_pool, \
+            ThreadPoolExecutor(max_workers=CONVERTER_IN_FLIGHT) as io_pool:
+        in_flight = {}
+        # Last error of each message that failed here, for the dead-letter stream
+        errors = {}
+        # Start with messages delivered to this consumer before a restart but never acknowledged
+        stream_id = '0'
+        claim_cursor = '0-0'
+        last_claim = time.monotonic()
+
+        while running or in_flight:
+            free_slots = CONVERTER_IN_FLIGHT - len(in_flight)
+            if running and free_slots > 0:
+                try:
+                    if stream_id == '>' and (claim_cursor != '0-0'
+                                             or time.monotonic() - last_claim > CONVERTER_CLAIM_IDLE_MS / 1000):
+                        last_claim = time.monotonic()
+                        response = redis_conn.xautoclaim(SOURCE_STREAM, CONVERTER_GROUP, CONVERTER_CONSUMER,
+                                                         CONVERTER_CLAIM_IDLE_MS, start_id=claim_cursor,
+                                                         count=free_slots)
+                        claim_cursor = response[0]
+                        messages = [(message_id, fields) for message_id, fields in response[1] if fields is not None]
+                        deliveries = delivery_counts(redis_conn, messages)
+                        exhausted = {message_id for message_id, _ in messages
+                                     if deliveries.get(message_id, 1) > CONVERTER_MAX_DELIVERIES}
+                        running_ids = set(in_flight.values())
+                        for message_id, fields in messages:
+                            if message_id in exhausted and message_id not in running_ids:
+                                error = errors.pop(message_id, 'failed in another converter')
+                                print(f"Message {message_id} delivered {deliveries[message_id]} times, "
+                                      f"dead-lettering: {error}")
+                                dead_letter(redis_conn, message_id, fields, error)
+                        messages = [(message_id, fields) for message_id, fields in messages
+                                    if message_id not in exhausted]
+                    else:
+                        response = redis_conn.xreadgroup(
+                            CONVERTER_GROUP, CONVERTER_CONSUMER, {SOURCE_STREAM: stream_id}, count=free_slots,
+                            block=None if stream_id != '>' else CONVERTER_POLL_MS if in_flight else CONVERTER_BLOCK_MS
+                        )
+                        messages = response[0][1] if response else []
+                        if stream_id != '>':
+                            # Page through the pending list from the last replayed ID, then switch to new ones
+                            stream_id = messages[-1][0] if len(messages) == free_slots else '>'
+                    # Messages still converting here are claimed or replayed too; they must not start twice
+                    running_ids = set(in_flight.values())
+                    messages = [(message_id, fields) for message_id, fields in messages
+                                if message_id not in running_ids]
+                except redis.RedisError as e:
+                    print(f"Error reading from stream {SOURCE_STREAM}: {e}")
+                    time.sleep(1)
+                    continue
+                for message_id, fields in messages:
+                    future = io_pool.submit(handle_message, redis_conn, s3_client, process_pool,
+                                            message_id, fields, cache, stats)
+                    in_flight[future] = message_id
+
+            if not in_flight:
+                continue
+            # Wait for a slot when full; otherwise the read above already waited up to CONVERTER_POLL_MS
+            done, _ = wait(in_flight, timeout=None if len(in_flight) >= CONVERTER_IN_FLIGHT or not running else 0,
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                message_id = in_flight.pop(future)
+                try:
+                    future.result()
+                    converted += 1
+                    errors.pop(message_id, None)
+                except Exception as e:
+                    print(f"Error converting message {message_id}, left pending for retry: {e}")
+                    errors[message_id] = repr(e)
+
+            if converted // 100 > reported:
+                reported = converted // 100
+                elapsed = time.perf_counter() - started
+                print(f"Converted {converted} recordings in {elapsed:.1f} s ({converted / elapsed:.1f} files/s), "
+                      f"{stats.summary()}")
+
+
+def benchmark_presets(wav_path):
+    """
+    Encode a local WAV file with pydub's defaults and with every preset, and
+    report encode time, CPU time and output size for each.
+    """
+    with open(wav_path, 'rb') as wav_file:
+        header = wav_file.read(64 * 1024)
+    wav_info = {}
+    parse_wav_chunks(header, 0, 12, wav_info)
+    print(f"{wav_path}: {wav_info['sample_rate']} Hz, {wav_info['channels']} channel(s), "
+          f"{wav_info['bits_per_sample']} bit, {os.path.getsize(wav_path)} bytes")
+
+    results = {}
+    for name, preset in [('pydub-default', {})] + list(ENCODER_PRESETS.items()):
+        if preset:
+            preset = dict(preset)
+            if preset.get('sample_rate'):
+                preset['sample_rate'] = min(preset['sample_rate'], wav_info['sample_rate'])
+            if preset.get('channels'):
+                preset['channels'] = min(preset['channels'], wav_info['channels'])
+        with tempfile.NamedTemporaryFile(suffix='.mp3') as mp3_file:
+            started = time.perf_counter()
+            cpu_seconds = convert_wav_to_mp3(wav_path, mp3_file.name, preset)
+            elapsed = time.perf_counter() - started
+            size = os.path.getsize(mp3_file.name)
+        results[name] = {'seconds': elapsed, 'cpu_seconds': cpu_seconds, 'bytes': size}
+        print(f"{name:>14}: {elapsed:6.2f} s wall, {cpu_seconds:6.2f} s CPU, {size:>10} bytes")
+    return results
+
+
+def main():
+    """Main function that runs the converter service until SIGINT or SIGTERM."""
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        validate_presets()
+    except ValueError as e:
+        print(f"Invalid encoder presets: {e}")
+        sys.exit(1)
+    redis_conn = get_redis_connection()
+    s3_client = get_s3_client()
+    if CONVERSION_CACHE == 'redis':
+        cache = RedisConversionCache(redis_conn)
+    elif CONVERSION_CACHE == 'sqlite':
+        cache = SQLiteConversionCache(CONVERSION_CACHE_SQLITE_PATH)
+    else:
+        cache = None
+    print(f"{CONVERTER_CONSUMER} converting {SOURCE_STREAM} in {TRANSCODE_MODE} mode with "
+          f"{CONVERTER_PROCESSES} processes, {CONVERTER_IN_FLIGHT} messages in flight")
+    run_converter(redis_conn, s3_client, cache)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['benchmark']:
+        benchmark_presets(sys.argv[2])
+    else:
+        main()
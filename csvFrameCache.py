@@ -0,0 +1,111 @@
+import os
+import hashlib
+import pandas as pd
+import pyarrow.feather as feather
+from botocore.exceptions import ClientError
+
+# Local cache of parsed reference CSVs, stored as uncompressed Arrow IPC files
+CSV_CACHE_DIR = os.environ.get('CSV_CACHE_DIR', '/tmp/gwas-csv-cache')
+CSV_CACHE_MAX_BYTES = int(os.environ.get('CSV_CACHE_MAX_BYTES', 1024 ** 3))
+
+
+class CsvFrameCache:
+    """
+    A size-bounded LRU cache of parsed CSV files, keyed by bucket, key and ETag.
+
+    A HEAD request whose ETag matches a cached entry skips both the download and
+    the parse; the entry is memory-mapped back into a DataFrame.
+
+    Attributes:
+        cache_dir (str): Directory holding the cached Arrow IPC files.
+        max_bytes (int): Total size above which the least recently used entries are evicted.
+        hits (int): Reads served from the cache.
+        misses (int): Reads that downloaded and parsed the CSV.
+        evictions (int): Entries deleted to stay under max_bytes.
+    """
+
+    def __init__(self, cache_dir=CSV_CACHE_DIR, max_bytes=CSV_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, bucket_name, file_path, etag, read_kwargs):
+        # The parse options are part of the key: other dtypes or columns give another frame
+        options = repr(sorted(read_kwargs.items()))
+        digest = hashlib.sha1(f"{bucket_name}\0{file_path}\0{etag}\0{options}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.arrow")
+
+    def read_csv(self, s3_client, bucket_name, file_path, **read_kwargs):
+        """
+        Returns the parsed CSV, from the cache when its ETag is unchanged.
+
+        Args:
+            s3_client: A boto3 S3 client object.
+            bucket_name: The name of the S3 bucket.
+            file_path: The key of the CSV file in S3.
+            read_kwargs: Extra keyword arguments for pd.read_csv.
+
+        Returns:
+            A Pandas DataFrame containing the CSV data.
+
+        Raises:
+            NoSuchKey: The object does not exist. HEAD reports this as a plain
+                404 ClientError; it is translated so callers catch the same
+                exception as with get_object.
+        """
+        try:
+            etag = s3_client.head_object(Bucket=bucket_name, Key=file_path)['ETag'].strip('"')
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey'):
+                raise
+            error = {'Error': {'Code': 'NoSuchKey', 'Message': f"s3://{bucket_name}/{file_path} does not exist"}}
+            raise s3_client.exceptions.NoSuchKey(error, 'HeadObject') from e
+        path = self._entry_path(bucket_name, file_path, etag, read_kwargs)
+        if os.path.exists(path):
+            self.hits += 1
+            os.utime(path)  # mark as recently used
+            return feather.read_table(path, memory_map=True).to_pandas()
+
+        self.misses += 1
+        response = s3_client.get_object(Bucket=bucket_name, Key=file_path)
+        df = pd.read_csv(response['Body'], **read_kwargs)
+
+        # Key the entry on the ETag of the body actually read, in case it changed since the HEAD
+        path = self._entry_path(bucket_name, file_path, response['ETag'].strip('"'), read_kwargs)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        feather.write_feather(df, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+        self.evict()
+        return df
+
+    def evict(self):
+        """
+        Deletes the least recently used entries until the cache fits in max_bytes.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.arrow'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        """
+        Returns the hit, miss and eviction counters and the hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -561,3 +561,1157 @@ result = process_message(message)
 if result:
    print(result)
 
+
+=============
+
+import os
+import time
+import queue
+import asyncio
+import socket
+import signal
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import redis
+import redis.asyncio
+import jaydebeapi
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Redis connection details from environment variables
+REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
+REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+REDIS_PASSWORD = os.getenv('REDIS_PASSWORD')
+
+# Redis stream names
+SOURCE_STREAM = os.getenv('REDIS_STREAM', 'collector')
+TARGET_STREAM = os.getenv('ENRICHED_STREAM', 'collector-enriched')
+# Consumer group of the downstream stage, created up front so nothing is trimmed before it reads
+ENRICHED_GROUP = os.getenv('ENRICHED_GROUP', 'collector-redis')
+
+# Consumer group settings
+ENRICH_GROUP = os.getenv('ENRICH_GROUP', 'collector-enrichment')
+# The same name after a restart or crash, so the '0' replay finds the entries
+# the previous process read but never acknowledged
+ENRICH_CONSUMER = os.getenv('ENRICH_CONSUMER', socket.gethostname())
+ENRICH_BATCH_SIZE = int(os.getenv('ENRICH_BATCH_SIZE', 500))
+ENRICH_BLOCK_MS = int(os.getenv('ENRICH_BLOCK_MS', 1000))
+
+# 'batch' enriches one micro-batch at a time; 'async' overlaps many chunks
+ENRICH_MODE = os.getenv('ENRICH_MODE', 'batch')
+ENRICH_CHUNK_SIZE = int(os.getenv('ENRICH_CHUNK_SIZE', 100))
+# Chunks being looked up or waiting to be published at once
+ENRICH_MAX_IN_FLIGHT = int(os.getenv('ENRICH_MAX_IN_FLIGHT', 16))
+# Publish chunks in the order they were read (async mode)
+ENRICH_ORDERED = os.getenv('ENRICH_ORDERED', '1') == '1'
+# Reuse the source entry IDs as output IDs, so Redis rejects replayed copies.
+# Needs a single consumer in ENRICH_GROUP: the process refuses to start otherwise
+ENRICH_EXPLICIT_IDS = os.getenv('ENRICH_EXPLICIT_IDS', '0') == '1'
+# Other consumers idle longer than this, with nothing pending, count as gone
+ENRICH_CONSUMER_GONE_MS = int(os.getenv('ENRICH_CONSUMER_GONE_MS', 5 * 60 * 1000))
+ENRICH_METRICS_INTERVAL = int(os.getenv('ENRICH_METRICS_INTERVAL', 30))
+ENRICH_METRICS_KEY = f"{ENRICH_GROUP}:metrics"
+
+# JDBC connection details from environment variables
+SQL_SERVER_JDBC_DRIVER = os.getenv('SQL_SERVER_JDBC_DRIVER')
+SQL_SERVER_JDBC_URL = os.getenv('SQL_SERVER_JDBC_URL')
+SQL_SERVER_USERNAME = os.getenv('SQL_SERVER_USERNAME')
+SQL_SERVER_PASSWORD = os.getenv('SQL_SERVER_PASSWORD')
+
+DB2_JDBC_DRIVER = os.getenv('DB2_JDBC_DRIVER')
+DB2_JDBC_URL = os.getenv('DB2_JDBC_URL')
+DB2_USERNAME = os.getenv('DB2_USERNAME')
+DB2_PASSWORD = os.getenv('DB2_PASSWORD')
+
+# jaydebeapi starts the JVM once with the classpath of the first connect, so
+# every connection passes both driver jars
+JDBC_CLASSPATH = [jar for jar in (SQL_SERVER_JDBC_DRIVER, DB2_JDBC_DRIVER) if jar]
+
+# Connection pool settings
+JDBC_POOL_SIZE = int(os.getenv('JDBC_POOL_SIZE', 2))
+# Idle connections are checked with a cheap query before reuse
+JDBC_VALIDATE_AFTER_SECONDS = int(os.getenv('JDBC_VALIDATE_AFTER_SECONDS', 60))
+
+# Set-based lookups; SQL Server allows 2100 parameters and 1000 VALUES rows per statement
+SQLSERVER_LOOKUP_CHUNK = int(os.getenv('SQLSERVER_LOOKUP_CHUNK', 1000))
+DB2_LOOKUP_CHUNK = int(os.getenv('DB2_LOOKUP_CHUNK', 1000))
+SQLSERVER_EXTRA_COLUMNS = ['additional_field1', 'additional_field2']
+
+# RCID -> MemberCIP cache; misses are remembered for a shorter time
+MEMBER_CIP_CACHE_SIZE = int(os.getenv('MEMBER_CIP_CACHE_SIZE', 200000))
+MEMBER_CIP_TTL_SECONDS = int(os.getenv('MEMBER_CIP_TTL_SECONDS', 12 * 3600))
+MEMBER_CIP_NEGATIVE_TTL_SECONDS = int(os.getenv('MEMBER_CIP_NEGATIVE_TTL_SECONDS', 300))
+# Shared tier so several enrichment workers reuse each other's lookups
+MEMBER_CIP_REDIS_TIER = os.getenv('MEMBER_CIP_REDIS_TIER', '0') == '1'
+MEMBER_CIP_REDIS_PREFIX = "member-cip"
+# Preload the RCIDs of yesterday's calls at startup
+MEMBER_CIP_WARM_UP = os.getenv('MEMBER_CIP_WARM_UP', '0') == '1'
+
+# Serve agentTerminationCall lookups from in-memory day partitions
+AGENT_CALL_SNAPSHOT = os.getenv('AGENT_CALL_SNAPSHOT', '0') == '1'
+SNAPSHOT_REFRESH_SECONDS = int(os.getenv('SNAPSHOT_REFRESH_SECONDS', 300))
+SNAPSHOT_MAX_DAYS = int(os.getenv('SNAPSHOT_MAX_DAYS', 3))
+# Column that grows on insert/update (e.g. a modified timestamp); deltas use calldate when unset
+SNAPSHOT_CHANGE_COLUMN = os.getenv('SNAPSHOT_CHANGE_COLUMN')
+# Query SQL Server for keys missing from the snapshot; turn off for backfills
+SNAPSHOT_FALLBACK = os.getenv('SNAPSHOT_FALLBACK', '1') == '1'
+
+running = True
+
+
+def stop(signum, frame):
+    """Signal handler that lets the current batch finish before exiting."""
+    global running
+    running = False
+
+
+class JdbcConnectionPool:
+    """
+    A fixed-size pool of long-lived database connections.
+
+    Connections are opened lazily by `connect`, a callable returning a DB-API
+    connection, and handed out by `connection()`. A connection that raised
+    while checked out is closed instead of returned, so the next checkout
+    opens a fresh one.
+    """
+
+    def __init__(self, connect, size=JDBC_POOL_SIZE, validation_query=None):
+        self.connect = connect
+        self.size = size
+        self.validation_query = validation_query
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            conn, returned_at = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_open = self.opened < self.size
+                if can_open:
+                    self.opened += 1
+            if not can_open:
+                conn, returned_at = self.idle.get()
+            else:
+                try:
+                    return self.connect()
+                except Exception:
+                    with self.lock:
+                        self.opened -= 1
+                    raise
+
+        if self.validation_query and time.monotonic() - returned_at > JDBC_VALIDATE_AFTER_SECONDS:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(self.validation_query)
+                cursor.fetchall()
+                cursor.close()
+            except Exception as e:
+                print(f"Discarding stale connection: {e}")
+                self.discard(conn)
+                return self.acquire()
+        return conn
+
+    def release(self, conn):
+        self.idle.put((conn, time.monotonic()))
+
+    def discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self.lock:
+            self.opened -= 1
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            self.discard(conn)
+            raise
+        self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+
+def jdbc_connector(driver_class, jdbc_url, username, password):
+    """Returns a callable that opens a JDBC connection through jaydebeapi."""
+    def connect():
+        return jaydebeapi.connect(driver_class, jdbc_url, [username, password], JDBC_CLASSPATH)
+    return connect
+
+
+def create_sqlserver_pool(size=JDBC_POOL_SIZE):
+    """Creates the SQL Server connection pool from environment settings."""
+    return JdbcConnectionPool(
+        jdbc_connector("com.microsoft.sqlserver.jdbc.SQLServerDriver", SQL_SERVER_JDBC_URL,
+                       SQL_SERVER_USERNAME, SQL_SERVER_PASSWORD),
+        size, validation_query="SELECT 1",
+    )
+
+
+def create_db2_pool(size=JDBC_POOL_SIZE):
+    """Creates the DB2 connection pool from environment settings."""
+    return JdbcConnectionPool(
+        jdbc_connector("com.ibm.db2.jcc.DB2Driver", DB2_JDBC_URL, DB2_USERNAME, DB2_PASSWORD),
+        size, validation_query="SELECT 1 FROM SYSIBM.SYSDUMMY1",
+    )
+
+
+def connect_to_redis():
+    """
+    Establishes a connection to the Redis server.
+
+    Returns:
+        A Redis client object.
+    """
+    try:
+        redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD, decode_responses=True)
+        redis_client.ping()
+        return redis_client
+    except redis.exceptions.ConnectionError as e:
+        print(f"Error connecting to Redis: {e}")
+        exit(1)
+
+
+def ensure_consumer_group(redis_client, stream_name, group_name):
+    """
+    Creates the consumer group (and the stream) if it does not exist yet.
+
+    Args:
+        redis_client: A Redis client object.
+        stream_name: The name of the Redis stream.
+        group_name: The name of the consumer group.
+    """
+    try:
+        redis_client.xgroup_create(stream_name, group_name, id='0', mkstream=True)
+    except redis.exceptions.ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+def convert_to_utc(calldate_str):
+    """
+    Normalizes a calldate string to the UTC format stored in agentTerminationCall.
+
+    Returns:
+        The formatted timestamp, or None if it cannot be parsed.
+    """
+    try:
+        local_datetime = datetime.strptime(calldate_str, "%Y-%m-%d %H:%M:%S")
+        local_datetime = local_datetime.replace(tzinfo=timezone.utc)
+        return local_datetime.strftime("%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError) as e:
+        print(f"Error converting calldate to UTC: {e}")
+        return None
+
+
+def chunked(items, size):
+    """Yields successive lists of at most `size` items."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def lookup_rcids(conn, keys, chunk_size=SQLSERVER_LOOKUP_CHUNK):
+    """
+    Resolves many (agentRACF, calldate_utc) pairs against agentTerminationCall
+    with one joined query per chunk, instead of one query per message.
+
+    The keys are sent as a VALUES derived table, which SQL Server joins like a
+    temp table without the extra round trips of creating and filling one.
+
+    Args:
+        conn: A SQL Server DB-API connection.
+        keys: A list of unique (agent_racf, calldate_utc) tuples.
+        chunk_size: Keys per statement (two parameters each).
+
+    Returns:
+        A dictionary mapping each found key to (rcid, extra columns dict).
+    """
+    extra_columns = ', '.join(f"t.{column}" for column in SQLSERVER_EXTRA_COLUMNS)
+    found = {}
+    cursor = conn.cursor()
+    try:
+        for chunk in chunked(keys, chunk_size):
+            values = ', '.join(['(?, ?)'] * len(chunk))
+            query = f"""
+            SELECT k.agentRACF, k.calldate, t.RCID, {extra_columns}
+            FROM agentTerminationCall t
+            JOIN (VALUES {values}) AS k(agentRACF, calldate)
+              ON t.agentRACF = k.agentRACF AND t.calldate = k.calldate
+            """
+            cursor.execute(query, [value for key in chunk for value in key])
+            for row in cursor.fetchall():
+                key = (row[0], row[1])
+                # Keep the first match, like the per-row fetchone did
+                if key not in found:
+                    found[key] = (row[2], dict(zip(SQLSERVER_EXTRA_COLUMNS, row[3:])))
+    finally:
+        cursor.close()
+    return found
+
+
+def normalize_calldate(value):
+    """Formats a calldate read from the database like convert_to_utc does."""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    # JDBC returns timestamps as strings, possibly with fractional seconds
+    return str(value)[:19]
+
+
+def snapshot_key(agent_racf, calldate):
+    """
+    Normalizes an (agentRACF, calldate_utc) key the way SQL Server compares
+    them: its default collation ignores case and trailing spaces.
+    """
+    return str(agent_racf).rstrip().upper(), calldate
+
+
+class AgentCallSnapshot:
+    """
+    An in-memory hash index of agentTerminationCall keyed by
+    (agentRACF, calldate_utc), loaded one day partition at a time.
+
+    A day is read in one bulk query the first time a message from that day
+    is looked up, and at most SNAPSHOT_MAX_DAYS days are kept. Every
+    SNAPSHOT_REFRESH_SECONDS the loaded days are refreshed with a delta query
+    for rows past the last seen SNAPSHOT_CHANGE_COLUMN (or calldate) value.
+    Keys missing from the snapshot go to SQL Server only when `fallback` is
+    on, so a backfill of past days never queries it per batch. Rows read by a
+    refresh replace the indexed ones, so an updated RCID is picked up; keys
+    are compared case-insensitively, like SQL Server does.
+
+    Works with any pool of DB-API connections whose SQL supports plain
+    range predicates.
+    """
+
+    def __init__(self, sqlserver_pool, fallback=SNAPSHOT_FALLBACK, max_days=SNAPSHOT_MAX_DAYS,
+                 refresh_seconds=SNAPSHOT_REFRESH_SECONDS, change_column=SNAPSHOT_CHANGE_COLUMN):
+        self.pool = sqlserver_pool
+        self.fallback = fallback
+        self.max_days = max_days
+        self.refresh_seconds = refresh_seconds
+        self.change_column = change_column or 'calldate'
+        self.days = OrderedDict()
+        self.watermarks = {}
+        self.next_refresh = time.monotonic() + refresh_seconds
+        self.lock = threading.Lock()
+        self.counters = {'snapshot_hits': 0, 'fallback_queries': 0, 'fallback_hits': 0,
+                         'misses': 0, 'rows_loaded': 0, 'days_loaded': 0, 'refreshes': 0, 'overflow_keys': 0}
+
+    def _select(self, where, params):
+        extra_columns = ''.join(f", {column}" for column in SQLSERVER_EXTRA_COLUMNS)
+        query = (f"SELECT agentRACF, calldate, RCID{extra_columns}, {self.change_column} "
+                 f"FROM agentTerminationCall WHERE {where}")
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def _index_rows(self, day, rows):
+        watermark = self.watermarks.get(day)
+        indexed = {}
+        for row in rows:
+            # Within one query keep the first match, like the per-row fetchone did
+            indexed.setdefault(snapshot_key(row[0], normalize_calldate(row[1])),
+                               (row[2], dict(zip(SQLSERVER_EXTRA_COLUMNS, row[3:-1]))))
+            if watermark is None or row[-1] > watermark:
+                watermark = row[-1]
+        # Rows read later are newer: a refresh overwrites what the load indexed
+        self.days[day].update(indexed)
+        self.watermarks[day] = watermark
+        self.counters['rows_loaded'] += len(rows)
+
+    def _day_bounds(self, day):
+        start = datetime.strptime(day, "%Y-%m-%d")
+        return start.strftime("%Y-%m-%d %H:%M:%S"), (start + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+
+    def _select_day(self, day, watermark=None):
+        start, end = self._day_bounds(day)
+        if watermark is None:
+            return self._select("calldate >= ? AND calldate < ?", (start, end))
+        # Inclusive, as several rows can share the watermark value; re-read rows overwrite themselves
+        return self._select(f"calldate >= ? AND calldate < ? AND {self.change_column} >= ?",
+                            (start, end, watermark))
+
+    def load_day(self, day, keep=()):
+        """
+        Loads one day partition ('YYYY-MM-DD') with a single bulk query.
+
+        The query runs without holding the lock, so lookups of other days go
+        on meanwhile; only the result is installed under it. Days in `keep`
+        are not evicted to make room.
+        """
+        rows = self._select_day(day)
+        with self.lock:
+            if day in self.days:
+                # Another thread loaded it meanwhile
+                return
+            self.days[day] = {}
+            self._index_rows(day, rows)
+            self.counters['days_loaded'] += 1
+            for evicted in [loaded for loaded in self.days if loaded not in keep]:
+                if len(self.days) <= self.max_days:
+                    break
+                del self.days[evicted]
+                self.watermarks.pop(evicted, None)
+        print(f"Loaded {len(rows)} agentTerminationCall rows for {day} into the snapshot")
+
+    def refresh(self):
+        """
+        Reads rows added to the loaded days since the last load or refresh.
+        The delta queries run without holding the lock.
+        """
+        with self.lock:
+            self.next_refresh = time.monotonic() + self.refresh_seconds
+            watermarks = [(day, self.watermarks.get(day)) for day in self.days]
+        for day, watermark in watermarks:
+            rows = self._select_day(day, watermark)
+            with self.lock:
+                if day in self.days:
+                    self._index_rows(day, rows)
+        with self.lock:
+            self.counters['refreshes'] += 1
+
+    def lookup(self, keys):
+        """
+        Resolves (agent_racf, calldate_utc) keys from the snapshot, loading
+        missing days first.
+
+        A batch spanning more than max_days days keeps its first max_days
+        days in the snapshot; keys of the other days are read with
+        lookup_rcids instead of evicting days the batch still needs.
+
+        Returns:
+            A dictionary mapping each found key to (rcid, extra columns dict),
+            the same shape lookup_rcids returns.
+        """
+        with self.lock:
+            refresh_due = time.monotonic() >= self.next_refresh
+            if refresh_due:
+                # Claimed here so concurrent lookups do not refresh as well
+                self.next_refresh = time.monotonic() + self.refresh_seconds
+        if refresh_due:
+            self.refresh()
+
+        by_day = {}
+        for key in keys:
+            by_day.setdefault(key[1][:10], []).append(key)
+        snapshot_days = list(by_day)[:self.max_days]
+        overflow = [key for day in list(by_day)[self.max_days:] for key in by_day[day]]
+        with self.lock:
+            unloaded = [day for day in snapshot_days if day not in self.days]
+        for day in unloaded:
+            self.load_day(day, keep=snapshot_days)
+
+        found, missing = {}, []
+        with self.lock:
+            for day in snapshot_days:
+                indexed = self.days.get(day)
+                if indexed is None:
+                    # Evicted by a concurrent lookup of other days
+                    overflow.extend(by_day[day])
+                    continue
+                self.days.move_to_end(day)
+                for key in by_day[day]:
+                    row = indexed.get(snapshot_key(*key))
+                    if row is not None:
+                        found[key] = row
+                    else:
+                        missing.append(key)
+            self.counters['snapshot_hits'] += len(found)
+            self.counters['overflow_keys'] += len(overflow)
+
+        queried_keys = overflow + (missing if self.fallback else [])
+        if queried_keys:
+            with self.pool.connection() as conn:
+                queried = lookup_rcids(conn, queried_keys)
+            with self.lock:
+                self.counters['fallback_queries'] += 1
+                self.counters['fallback_hits'] += len(queried)
+                for key, row in queried.items():
+                    if key[1][:10] in self.days:
+                        self.days[key[1][:10]][snapshot_key(*key)] = row
+            found.update(queried)
+        with self.lock:
+            self.counters['misses'] += len(keys) - len(found)
+        return found
+
+    def stats(self):
+        """Returns the counters plus the number of indexed rows."""
+        with self.lock:
+            return dict(self.counters, days=list(self.days), indexed_rows=sum(map(len, self.days.values())))
+
+
+def lookup_member_cips(conn, rcids, chunk_size=DB2_LOOKUP_CHUNK):
+    """
+    Resolves many RCIDs against the DB2 member table with one IN query per chunk.
+
+    Args:
+        conn: A DB2 DB-API connection.
+        rcids: A list of unique RCIDs.
+        chunk_size: RCIDs per statement.
+
+    Returns:
+        A dictionary mapping each found RCID to its MemberCIP.
+    """
+    found = {}
+    cursor = conn.cursor()
+    try:
+        for chunk in chunked(rcids, chunk_size):
+            placeholders = ', '.join(['?'] * len(chunk))
+            cursor.execute(f"SELECT RCID, MemberCIP FROM memberTable WHERE RCID IN ({placeholders})", list(chunk))
+            for rcid, member_cip in cursor.fetchall():
+                found.setdefault(rcid, member_cip)
+    finally:
+        cursor.close()
+    return found
+
+
+class MemberCipCache:
+    """
+    A bounded LRU cache of RCID -> MemberCIP with a TTL, in front of the DB2
+    lookup, with an optional shared Redis tier.
+
+    RCIDs that DB2 does not know are cached as misses with a shorter TTL, so
+    they are not queried again for every message. The cache is thread-safe
+    and counts hits, misses and DB2 round trips; lookups made to warm it up
+    are counted apart, so the hit ratio reflects live traffic only.
+    """
+
+    MISSING = ''
+
+    def __init__(self, redis_client=None, max_size=MEMBER_CIP_CACHE_SIZE, ttl=MEMBER_CIP_TTL_SECONDS,
+                 negative_ttl=MEMBER_CIP_NEGATIVE_TTL_SECONDS, prefix=MEMBER_CIP_REDIS_PREFIX):
+        self.redis_client = redis_client
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.prefix = prefix
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'negative_hits': 0, 'redis_hits': 0, 'misses': 0,
+                         'db_round_trips': 0, 'db_rows': 0, 'warmed_up': 0}
+
+    def _store(self, rcid, member_cip, now, ttl=None):
+        default_ttl = self.negative_ttl if member_cip == self.MISSING else self.ttl
+        ttl = default_ttl if ttl is None else min(ttl, default_ttl)
+        self.entries[rcid] = (member_cip, now + ttl)
+        self.entries.move_to_end(rcid)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def get_many(self, rcids, count=True):
+        """
+        Looks RCIDs up in memory, then in Redis.
+
+        Args:
+            rcids: The RCIDs to look up.
+            count: Whether to add the lookups to the hit and miss counters.
+
+        Returns:
+            A tuple (found, unknown): found maps RCIDs to their MemberCIP, or
+            to MISSING for cached misses; unknown lists the RCIDs to query.
+        """
+        found, unknown = {}, []
+        now = time.monotonic()
+        with self.lock:
+            for rcid in rcids:
+                entry = self.entries.get(rcid)
+                if entry is not None and entry[1] > now:
+                    self.entries.move_to_end(rcid)
+                    found[rcid] = entry[0]
+                    if count:
+                        self.counters['negative_hits' if entry[0] == self.MISSING else 'hits'] += 1
+                else:
+                    unknown.append(rcid)
+
+        if unknown and self.redis_client is not None:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for rcid in unknown:
+                pipeline.get(f"{self.prefix}:{rcid}")
+                pipeline.pttl(f"{self.prefix}:{rcid}")
+            replies = pipeline.execute()
+            still_unknown = []
+            with self.lock:
+                for rcid, value, remaining_ms in zip(unknown, replies[0::2], replies[1::2]):
+                    if value is None:
+                        still_unknown.append(rcid)
+                        continue
+                    # Redis entries carry their own TTL; keep them locally for the shorter one
+                    self._store(rcid, value, now, remaining_ms / 1000 if remaining_ms > 0 else None)
+                    found[rcid] = value
+                    if count:
+                        self.counters['redis_hits'] += 1
+            unknown = still_unknown
+
+        if count:
+            with self.lock:
+                self.counters['misses'] += len(unknown)
+        return found, unknown
+
+    def put_many(self, queried, found):
+        """
+        Caches the result of a DB2 lookup: RCIDs in `found` as hits, the other
+        `queried` RCIDs as misses.
+        """
+        now = time.monotonic()
+        values = {rcid: to_stream_value(found[rcid]) if rcid in found else self.MISSING for rcid in queried}
+        with self.lock:
+            for rcid, member_cip in values.items():
+                self._store(rcid, member_cip, now)
+        if values and self.redis_client is not None:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for rcid, member_cip in values.items():
+                ttl = self.negative_ttl if member_cip == self.MISSING else self.ttl
+                pipeline.set(f"{self.prefix}:{rcid}", member_cip, ex=ttl)
+            pipeline.execute()
+
+    def lookup(self, rcids, db2_pool, count=True):
+        """
+        Resolves RCIDs through the cache, querying DB2 only for unknown ones.
+
+        Args:
+            rcids: The RCIDs to resolve.
+            db2_pool: The DB2 JdbcConnectionPool.
+            count: Whether to add the lookups to the counters; warm-up passes
+                False so preloading does not show up as misses.
+
+        Returns:
+            A dictionary mapping each RCID known to DB2 to its MemberCIP.
+        """
+        found, unknown = self.get_many(rcids, count)
+        if unknown:
+            with db2_pool.connection() as conn:
+                queried = lookup_member_cips(conn, unknown)
+            with self.lock:
+                if count:
+                    self.counters['db_round_trips'] += -(-len(unknown) // DB2_LOOKUP_CHUNK)
+                    self.counters['db_rows'] += len(queried)
+                else:
+                    self.counters['warmed_up'] += len(unknown)
+            self.put_many(unknown, queried)
+            found.update({rcid: to_stream_value(member_cip) for rcid, member_cip in queried.items()})
+        return {rcid: member_cip for rcid, member_cip in found.items() if member_cip != self.MISSING}
+
+    def stats(self):
+        """Returns the counters plus the cache size and hit ratio."""
+        with self.lock:
+            stats = dict(self.counters, size=len(self.entries))
+        lookups = stats['hits'] + stats['negative_hits'] + stats['redis_hits'] + stats['misses']
+        stats['hit_ratio'] = round((lookups - stats['misses']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def warm_up_member_cips(cache, sqlserver_pool, db2_pool, day=None):
+    """
+    Preloads the cache with the RCIDs of one day's calls (yesterday in UTC by
+    default), read in one query from agentTerminationCall.
+
+    Returns:
+        The number of RCIDs loaded.
+    """
+    day = day or (datetime.now(timezone.utc) - timedelta(days=1)).date()
+    start = datetime.combine(day, datetime.min.time()).strftime("%Y-%m-%d %H:%M:%S")
+    end = datetime.combine(day + timedelta(days=1), datetime.min.time()).strftime("%Y-%m-%d %H:%M:%S")
+    with sqlserver_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT DISTINCT RCID FROM agentTerminationCall WHERE calldate >= ? AND calldate < ?", (start, end)
+            )
+            rcids = [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    cache.lookup(rcids, db2_pool, count=False)
+    print(f"Warmed up MemberCIP cache with {len(rcids)} RCIDs from {day}: {cache.stats()}")
+    return len(rcids)
+
+
+def to_stream_value(value):
+    """Converts a database value to something XADD accepts."""
+    if value is None:
+        return ''
+    if isinstance(value, (str, int, float, bytes)):
+        return value
+    return str(value)
+
+
+def prepare_messages(messages):
+    """
+    Extracts the (agent_racf, calldate_utc) lookup key of each message.
+
+    Returns:
+        A list of (message_id, message, key) tuples; messages without a
+        usable key are reported and left out.
+    """
+    keyed = []
+    for message_id, message in messages:
+        calldate = message.get('calldate')
+        agent_racf = message.get('agent_racf')
+        if not agent_racf or not calldate:
+            print(f"Message {message_id} does not contain 'calldate' or 'agent_racf' field")
+            continue
+        calldate_utc = convert_to_utc(calldate)
+        if calldate_utc is None:
+            continue
+        keyed.append((message_id, message, (agent_racf, calldate_utc)))
+    return keyed
+
+
+def resolve_rcids(keyed, sqlserver_pool, snapshot=None):
+    """Looks up the RCIDs of prepared messages in one query (or the snapshot)."""
+    unique_keys = list({key for _, _, key in keyed})
+    if not unique_keys:
+        return {}
+    if snapshot is not None:
+        return snapshot.lookup(unique_keys)
+    with sqlserver_pool.connection() as conn:
+        return lookup_rcids(conn, unique_keys)
+
+
+def resolve_member_cips(rcids, db2_pool, member_cache=None):
+    """Looks up the member CIPs of resolved RCIDs in one query (or the cache)."""
+    unique_rcids = list({rcid for rcid, _ in rcids.values()})
+    if not unique_rcids:
+        return {}
+    if member_cache is not None:
+        return member_cache.lookup(unique_rcids, db2_pool)
+    with db2_pool.connection() as conn:
+        return lookup_member_cips(conn, unique_rcids)
+
+
+def build_enriched(keyed, rcids, member_cips):
+    """Merges the lookup results into copies of the prepared messages."""
+    enriched = []
+    for message_id, message, key in keyed:
+        if key not in rcids:
+            print(f"Failed to retrieve RCID for agent_racf: {key[0]}")
+            continue
+        rcid, sql_server_data = rcids[key]
+        if rcid not in member_cips:
+            print(f"Failed to retrieve member CIP for RCID: {rcid}")
+            continue
+        output_message = dict(message)
+        output_message.update({column: to_stream_value(value) for column, value in sql_server_data.items()})
+        output_message['rcid'] = to_stream_value(rcid)
+        output_message['member_cip'] = to_stream_value(member_cips[rcid])
+        enriched.append((message_id, output_message))
+    return enriched
+
+
+def enrich_batch(messages, sqlserver_pool, db2_pool, member_cache=None, snapshot=None):
+    """
+    Enriches a batch of collector messages with two set-based queries: one to
+    SQL Server for the RCIDs and one to DB2 for the member CIPs.
+
+    Args:
+        messages: A list of (message_id, fields) tuples.
+        sqlserver_pool: The SQL Server JdbcConnectionPool.
+        db2_pool: The DB2 JdbcConnectionPool.
+        member_cache: An optional MemberCipCache in front of DB2.
+        snapshot: An optional AgentCallSnapshot replacing the SQL Server query.
+
+    Returns:
+        A list of (message_id, output_message) tuples for the messages that
+        could be enriched. Messages that could not are reported and left out.
+    """
+    keyed = prepare_messages(messages)
+    rcids = resolve_rcids(keyed, sqlserver_pool, snapshot)
+    member_cips = resolve_member_cips(rcids, db2_pool, member_cache)
+    return build_enriched(keyed, rcids, member_cips)
+
+
+def stage_enriched(pipeline, enriched, explicit_ids, target_stream=TARGET_STREAM):
+    """
+    Queues the XADDs of enriched messages on a pipeline. Every entry carries
+    its source_id; with `explicit_ids` the source entry ID is also reused as
+    the output entry ID, so Redis itself rejects a second copy.
+    """
+    for message_id, output_message in enriched:
+        pipeline.xadd(target_stream, {**output_message, 'source_id': message_id},
+                      id=message_id if explicit_ids else '*')
+
+
+def rejected_entries(enriched, results):
+    """
+    Returns the enriched entries whose explicit ID was rejected as not above
+    the stream's top ID, and raises any other error.
+    """
+    rejected = []
+    for entry, result in zip(enriched, results):
+        if isinstance(result, Exception):
+            if 'equal or smaller' not in str(result):
+                raise result
+            rejected.append(entry)
+    return rejected
+
+
+def publish_enriched(redis_client, enriched, explicit_ids, target_stream=TARGET_STREAM):
+    """
+    XADDs enriched messages. A rejected explicit ID only means a duplicate
+    when that ID is really in the stream; otherwise the entry arrived behind
+    a newer one (another consumer, or a switch from auto IDs) and is written
+    again with an auto ID, so it is never dropped.
+
+    Returns:
+        The number of entries skipped as duplicates.
+    """
+    if not enriched:
+        return 0
+    pipeline = redis_client.pipeline(transaction=False)
+    stage_enriched(pipeline, enriched, explicit_ids, target_stream)
+    rejected = rejected_entries(enriched, pipeline.execute(raise_on_error=False))
+    if not rejected:
+        return 0
+    pipeline = redis_client.pipeline(transaction=False)
+    for message_id, _ in rejected:
+        pipeline.xrange(target_stream, message_id, message_id)
+    late = [entry for entry, existing in zip(rejected, pipeline.execute()) if not existing]
+    if late:
+        print(f"{len(late)} entries are older than the top of {target_stream}, writing them with new IDs")
+        pipeline = redis_client.pipeline(transaction=False)
+        stage_enriched(pipeline, late, False, target_stream)
+        pipeline.execute()
+    return len(rejected) - len(late)
+
+
+def publish_batch(redis_client, message_ids, enriched, target_stream=TARGET_STREAM, explicit_ids=ENRICH_EXPLICIT_IDS):
+    """
+    Writes the enriched messages, then acknowledges the whole batch.
+
+    A crash between the two replays the batch. With explicit IDs the entries
+    already written are rejected as duplicates; without them the replayed
+    copies carry the same source_id and _id, and the indexer's upserts by
+    _id make them harmless.
+
+    Returns:
+        The number of entries skipped as duplicates.
+    """
+    duplicates = publish_enriched(redis_client, enriched, explicit_ids, target_stream)
+    if message_ids:
+        redis_client.xack(SOURCE_STREAM, ENRICH_GROUP, *message_ids)
+    return duplicates
+
+
+def check_single_consumer(redis_client, consumer_name=ENRICH_CONSUMER, gone_ms=ENRICH_CONSUMER_GONE_MS):
+    """
+    Explicit output IDs only increase if one consumer publishes. Returns the
+    other consumers of ENRICH_GROUP that are still active or hold pending
+    entries; an empty list means it is safe to use explicit IDs.
+    """
+    return [consumer['name'] for consumer in redis_client.xinfo_consumers(SOURCE_STREAM, ENRICH_GROUP)
+            if consumer['name'] != consumer_name and (consumer['pending'] or consumer['idle'] < gone_ms)]
+
+
+def process_redis_stream(redis_client, sqlserver_pool, db2_pool, batch_size=ENRICH_BATCH_SIZE, member_cache=None,
+                         snapshot=None):
+    """
+    Reads the collector stream through a consumer group in micro-batches and
+    enriches each batch with set-based lookups over pooled connections.
+
+    Pending messages of this consumer are replayed first. A batch whose
+    lookups fail stays pending and is read again on the next pass.
+    """
+    ensure_consumer_group(redis_client, SOURCE_STREAM, ENRICH_GROUP)
+    stream_id = '0'
+    processed = 0
+    started = time.monotonic()
+    while running:
+        try:
+            response = redis_client.xreadgroup(
+                ENRICH_GROUP, ENRICH_CONSUMER, {SOURCE_STREAM: stream_id},
+                count=batch_size, block=None if stream_id != '>' else ENRICH_BLOCK_MS
+            )
+            messages = response[0][1] if response else []
+            if not messages:
+                stream_id = '>'
+                continue
+
+            enriched = enrich_batch(messages, sqlserver_pool, db2_pool, member_cache, snapshot)
+            duplicates = publish_batch(redis_client, [message_id for message_id, _ in messages], enriched)
+
+            processed += len(messages)
+            elapsed = time.monotonic() - started
+            print(f"Enriched {len(enriched)}/{len(messages)} messages, {duplicates} already published "
+                  f"({processed / elapsed if elapsed else 0:.0f} messages/s overall)")
+            if member_cache is not None:
+                print(f"MemberCIP cache: {member_cache.stats()}")
+            if snapshot is not None:
+                print(f"agentTerminationCall snapshot: {snapshot.stats()}")
+        except redis.RedisError as e:
+            print(f"Redis error: {e}")
+            time.sleep(1)
+        except Exception as e:
+            # Leave the batch pending; replay it from this consumer's PEL
+            print(f"Enrichment error, batch left pending: {e}")
+            stream_id = '0'
+            time.sleep(1)
+
+
+class EnrichmentMetrics:
+    """
+    Backpressure counters of the async enrichment stage: how long the reader
+    waited for a free in-flight slot, how deep the queues are, and how long
+    the lookups take.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.messages = 0
+        self.enriched = 0
+        self.chunks = 0
+        self.failed_chunks = 0
+        self.duplicates = 0
+        self.in_flight = 0
+        self.reorder_waiting = 0
+        self.slot_wait_seconds = 0.0
+        self.slot_wait_max = 0.0
+        self.lookup_seconds = 0.0
+        self.lookup_max = 0.0
+
+    def observe_slot_wait(self, seconds):
+        self.slot_wait_seconds += seconds
+        self.slot_wait_max = max(self.slot_wait_max, seconds)
+
+    def observe_chunk(self, messages, enriched, lookup_seconds):
+        self.chunks += 1
+        self.messages += messages
+        self.enriched += enriched
+        self.lookup_seconds += lookup_seconds
+        self.lookup_max = max(self.lookup_max, lookup_seconds)
+
+    def snapshot(self, sqlserver_executor, db2_executor):
+        elapsed = time.monotonic() - self.started
+        return {
+            'messages': self.messages,
+            'enriched': self.enriched,
+            'failed_chunks': self.failed_chunks,
+            'duplicates': self.duplicates,
+            'messages_per_second': round(self.messages / elapsed, 1) if elapsed else 0.0,
+            'in_flight': self.in_flight,
+            # Chunks done but waiting for an earlier chunk to be published
+            'reorder_waiting': self.reorder_waiting,
+            # Work queued behind busy JDBC threads
+            'sqlserver_queue_depth': sqlserver_executor._work_queue.qsize(),
+            'db2_queue_depth': db2_executor._work_queue.qsize(),
+            'slot_wait_seconds': round(self.slot_wait_seconds, 3),
+            'slot_wait_max': round(self.slot_wait_max, 3),
+            'lookup_avg': round(self.lookup_seconds / self.chunks, 4) if self.chunks else 0.0,
+            'lookup_max': round(self.lookup_max, 4),
+        }
+
+
+async def run_async_enrichment(redis_client, sqlserver_pool, db2_pool, member_cache=None, snapshot=None,
+                               ordered=ENRICH_ORDERED, explicit_ids=ENRICH_EXPLICIT_IDS,
+                               max_in_flight=ENRICH_MAX_IN_FLIGHT,
+                               chunk_size=ENRICH_CHUNK_SIZE, batch_size=ENRICH_BATCH_SIZE):
+    """
+    Enriches the collector stream with many lookups in flight at once.
+
+    Each XREADGROUP batch is split into chunks of `chunk_size` messages. The
+    blocking JDBC calls of a chunk run on a SQL Server thread pool and then
+    a DB2 thread pool, each sized to its connection pool. So while one chunk
+    waits on DB2, the next ones are already querying SQL Server. At most
+    `max_in_flight` chunks are being looked up or waiting to be published;
+    when all slots are taken the reader stops reading, which is the stage's
+    backpressure.
+
+    With `ordered`, chunks are published in the order they were read, and
+    a failed chunk also holds back the chunks read after it, so the replay
+    does not publish it behind them. Otherwise each chunk is published as
+    soon as it is done, and consumers restore the order by source_id. With
+    `explicit_ids` the source entry IDs are reused, as in publish_batch;
+    that needs `ordered`. Failed chunks stay pending and are replayed once
+    the in-flight chunks have drained.
+
+    Args:
+        redis_client: A redis.asyncio client with decode_responses=True.
+    """
+    loop = asyncio.get_running_loop()
+    sqlserver_executor = ThreadPoolExecutor(sqlserver_pool.size, thread_name_prefix='sqlserver')
+    db2_executor = ThreadPoolExecutor(db2_pool.size, thread_name_prefix='db2')
+    slots = asyncio.Semaphore(max_in_flight)
+    reorder_queue = deque()
+    metrics = EnrichmentMetrics()
+    tasks = set()
+    replay = False
+
+    try:
+        await redis_client.xgroup_create(SOURCE_STREAM, ENRICH_GROUP, id='0', mkstream=True)
+    except redis.exceptions.ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+    async def enrich_chunk(chunk):
+        keyed = prepare_messages(chunk)
+        started = time.monotonic()
+        rcids = await loop.run_in_executor(sqlserver_executor, resolve_rcids, keyed, sqlserver_pool, snapshot)
+        member_cips = await loop.run_in_executor(db2_executor, resolve_member_cips, rcids, db2_pool, member_cache)
+        enriched = build_enriched(keyed, rcids, member_cips)
+        metrics.observe_chunk(len(chunk), len(enriched), time.monotonic() - started)
+        return enriched
+
+    async def publish_chunk(chunk, enriched):
+        if enriched:
+            pipeline = redis_client.pipeline(transaction=False)
+            stage_enriched(pipeline, enriched, explicit_ids)
+            rejected = rejected_entries(enriched, await pipeline.execute(raise_on_error=False))
+            if rejected:
+                # Same check as publish_enriched: only an ID already in the stream is a duplicate
+                pipeline = redis_client.pipeline(transaction=False)
+                for message_id, _ in rejected:
+                    pipeline.xrange(TARGET_STREAM, message_id, message_id)
+                late = [entry for entry, existing in zip(rejected, await pipeline.execute()) if not existing]
+                if late:
+                    print(f"{len(late)} entries are older than the top of {TARGET_STREAM}, writing them with new IDs")
+                    pipeline = redis_client.pipeline(transaction=False)
+                    stage_enriched(pipeline, late, False)
+                    await pipeline.execute()
+                metrics.duplicates += len(rejected) - len(late)
+        await redis_client.xack(SOURCE_STREAM, ENRICH_GROUP, *[message_id for message_id, _ in chunk])
+
+    async def process_chunk(chunk, previous):
+        nonlocal replay
+        try:
+            enriched = await enrich_chunk(chunk)
+            if previous is not None:
+                # Publish after the chunk read before this one
+                metrics.reorder_waiting += 1
+                try:
+                    await asyncio.wait([previous])
+                finally:
+                    metrics.reorder_waiting -= 1
+                if not previous.result():
+                    raise RuntimeError("an earlier chunk failed")
+            await publish_chunk(chunk, enriched)
+            return True
+        except Exception as e:
+            print(f"Enrichment error, chunk of {len(chunk)} left pending: {e}")
+            metrics.failed_chunks += 1
+            replay = True
+            return False
+        finally:
+            metrics.in_flight -= 1
+            slots.release()
+
+    async def report_metrics():
+        while True:
+            await asyncio.sleep(ENRICH_METRICS_INTERVAL)
+            stats = metrics.snapshot(sqlserver_executor, db2_executor)
+            print(f"Async enrichment: {stats}")
+            if member_cache is not None:
+                print(f"MemberCIP cache: {member_cache.stats()}")
+            if snapshot is not None:
+                print(f"agentTerminationCall snapshot: {snapshot.stats()}")
+            await redis_client.hset(ENRICH_METRICS_KEY, mapping=stats)
+
+    reporter = asyncio.create_task(report_metrics())
+    stream_id = '0'
+    try:
+        while running:
+            if replay:
+                # Pending entries include the in-flight ones; let them settle first
+                if tasks:
+                    await asyncio.wait(tasks)
+                replay = False
+                stream_id = '0'
+                await asyncio.sleep(1)
+
+            try:
+                response = await redis_client.xreadgroup(
+                    ENRICH_GROUP, ENRICH_CONSUMER, {SOURCE_STREAM: stream_id},
+                    count=batch_size, block=None if stream_id != '>' else ENRICH_BLOCK_MS
+                )
+            except redis.RedisError as e:
+                print(f"Redis error: {e}")
+                await asyncio.sleep(1)
+                continue
+            messages = response[0][1] if response else []
+            if not messages:
+                stream_id = '>'
+                continue
+
+            for chunk in chunked(messages, chunk_size):
+                wait_started = time.monotonic()
+                await slots.acquire()
+                metrics.observe_slot_wait(time.monotonic() - wait_started)
+                metrics.in_flight += 1
+                while reorder_queue and reorder_queue[0].done():
+                    reorder_queue.popleft()
+                previous = reorder_queue[-1] if ordered and reorder_queue else None
+                task = asyncio.create_task(process_chunk(chunk, previous))
+                reorder_queue.append(task)
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if stream_id != '>':
+                # Replayed entries are now in flight; page on past them until the PEL is exhausted
+                stream_id = messages[-1][0]
+        if tasks:
+            await asyncio.wait(tasks)
+    finally:
+        reporter.cancel()
+        print(f"Async enrichment stopped: {metrics.snapshot(sqlserver_executor, db2_executor)}")
+        sqlserver_executor.shutdown(wait=True)
+        db2_executor.shutdown(wait=True)
+
+
+def main():
+    """
+    Main function that opens the connection pools and enriches the collector
+    stream until it receives SIGINT or SIGTERM.
+    """
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    if TARGET_STREAM == SOURCE_STREAM:
+        print(f"ENRICHED_STREAM must differ from {SOURCE_STREAM}, or the enrichment reads its own output")
+        exit(1)
+    redis_client = connect_to_redis()
+    ensure_consumer_group(redis_client, TARGET_STREAM, ENRICHED_GROUP)
+    if ENRICH_EXPLICIT_IDS:
+        if ENRICH_MODE == 'async' and not ENRICH_ORDERED:
+            print("ENRICH_EXPLICIT_IDS=1 needs ENRICH_ORDERED=1 in async mode")
+            exit(1)
+        ensure_consumer_group(redis_client, SOURCE_STREAM, ENRICH_GROUP)
+        others = check_single_consumer(redis_client)
+        if others:
+            print(f"ENRICH_EXPLICIT_IDS=1 needs a single consumer in {ENRICH_GROUP}, but {others} are active or "
+                  f"hold pending entries; stop them or XGROUP DELCONSUMER them, or run with ENRICH_EXPLICIT_IDS=0")
+            exit(1)
+    sqlserver_pool = create_sqlserver_pool()
+    db2_pool = create_db2_pool()
+    member_cache = MemberCipCache(redis_client if MEMBER_CIP_REDIS_TIER else None)
+    snapshot = AgentCallSnapshot(sqlserver_pool) if AGENT_CALL_SNAPSHOT else None
+    try:
+        if MEMBER_CIP_WARM_UP:
+            warm_up_member_cips(member_cache, sqlserver_pool, db2_pool)
+        if ENRICH_MODE == 'async':
+            async_redis_client = redis.asyncio.Redis(host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD,
+                                                     decode_responses=True)
+            asyncio.run(run_async_enrichment(async_redis_client, sqlserver_pool, db2_pool, member_cache, snapshot))
+        else:
+            process_redis_stream(redis_client, sqlserver_pool, db2_pool, member_cache=member_cache, snapshot=snapshot)
+    finally:
+        sqlserver_pool.close()
+        db2_pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -106,11 +106,13 @@ def list_files_in_s3(bucket_name, prefix=''):
     - list : List of file names
     """
     s3 = boto3.client('s3')
-    response = s3.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
+    paginator = s3.get_paginator('list_objects_v2')
     files = []
     
-    for obj in response.get('Contents', []):
-        files.append(obj['Key'])
+    # Page through every result; a single list_objects_v2 call stops at 1000 keys
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            files.append(obj['Key'])
     
     return files
 
@@ -185,3 +187,39 @@ file_key1 = 'path/to/your/first.csv'
 file_key2 = 'path/to/your/second.csv'
 merged_df = join_csv_files_from_s3(bucket_name, file_key1, file_key2)
 print(merged_df)
+
+========
+
+import time
+import boto3
+import pandas as pd
+from csvFrameCache import CsvFrameCache
+
+
+def read_csv_from_s3(bucket_name, file_key, cache=None, **read_kwargs):
+    """
+    Read a CSV file from an S3 bucket and return a pandas DataFrame.
+
+    Parameters:
+    - bucket_name: str : Name of the S3 bucket
+    - file_key: str : Key of the CSV file in the S3 bucket
+    - cache: CsvFrameCache : Optional cache; the file is only downloaded when its ETag changed
+    - read_kwargs: Extra keyword arguments for pd.read_csv
+
+    Returns:
+    - pd.DataFrame : DataFrame containing the CSV data
+    """
+    s3 = boto3.client('s3')
+    if cache is not None:
+        return cache.read_csv(s3, bucket_name, file_key, **read_kwargs)
+    response = s3.get_object(Bucket=bucket_name, Key=file_key)
+    return pd.read_csv(response['Body'], **read_kwargs)
+
+if __name__ == "__main__":
+    # Example usage:
+    bucket_name = 'your-bucket-name'
+    file_key = 'path/to/agent-roster.csv'
+    cache = CsvFrameCache()
+    started = time.perf_counter()
+    roster_df = read_csv_from_s3(bucket_name, file_key, cache=cache)
+    print(f"Read {len(roster_df)} rows in {time.perf_counter() - started:.3f} s, cache stats: {cache.stats()}")
@@ -381,3 +381,872 @@ def main():
 
 if __name__ == "__main__":
    main()
+
+
+==============
+
+import os
+import sys
+import time
+import uuid
+import sqlite3
+import threading
+import boto3
+import redis
+import numpy as np
+import pandas as pd
+from array import array
+from botocore.config import Config
+from csvFrameCache import CsvFrameCache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+# Set environment variables
+S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME')
+S3_ROOT_DIR = os.environ.get('S3_ROOT_DIR', '')
+REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD')
+
+# Redis stream and publishing settings
+REDISTREAM_KEY = "gwas-recordings"
+PUBLISH_BATCH_SIZE = int(os.environ.get('PUBLISH_BATCH_SIZE', 5000))
+PUBLISH_TRANSACTION = os.environ.get('PUBLISH_TRANSACTION', 'false').lower() == 'true'
+
+# S3 listing settings
+LISTING_MAX_WORKERS = int(os.environ.get('LISTING_MAX_WORKERS', 16))
+LISTING_SHARD_DEPTH = int(os.environ.get('LISTING_SHARD_DEPTH', 1))
+
+# Incremental ingest settings
+INGEST_MODE = os.environ.get('INGEST_MODE', 'full')  # 'full' or 'incremental'
+WATERMARK_BACKEND = os.environ.get('WATERMARK_BACKEND', 'sqlite')  # 'sqlite' or 'redis'
+WATERMARK_SQLITE_PATH = os.environ.get('WATERMARK_SQLITE_PATH', 'step1_watermark.db')
+WATERMARK_REDIS_PREFIX = "gwas-recordings:watermark"
+WATERMARK_TTL_SECONDS = int(os.environ.get('WATERMARK_TTL_SECONDS', 7 * 24 * 3600))
+# Only set when recording keys are written in ascending order (e.g. timestamped names);
+# listing then resumes after the last-seen key instead of relisting the whole day.
+INCREMENTAL_KEYS_ORDERED = os.environ.get('INCREMENTAL_KEYS_ORDERED', 'false').lower() == 'true'
+RECORDING_EXTENSION = '.wav'
+
+# Sets the last-seen key to the larger of the stored and the given key in one
+# step, so concurrent ingesters cannot move it backwards; refreshes the TTL either way.
+# KEYS[1] = last-seen key; ARGV[1] = candidate key, ARGV[2] = TTL in seconds
+WATERMARK_MAX_LUA = """
+local current = redis.call('GET', KEYS[1])
+if not current or ARGV[1] > current then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', tonumber(ARGV[2]))
+else
+    redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+end
+return 1
+"""
+
+# Join settings: 'memory' merges whole DataFrames, 'streaming' joins call.csv chunk by chunk
+JOIN_MODE = os.environ.get('JOIN_MODE', 'memory')
+CALL_CSV_CHUNK_SIZE = int(os.environ.get('CALL_CSV_CHUNK_SIZE', 100_000))
+CALL_CSV_DTYPES = {'ID': str, 'file_name': str, 'call_date': str}
+ROSTER_CSV_DTYPES = {'ID': str, 'agent_racf': 'category'}
+
+# Local cache of parsed reference CSVs (agent-roster.csv); set CSV_CACHE_DIR='' to disable
+CSV_CACHE_DIR = os.environ.get('CSV_CACHE_DIR', '/tmp/gwas-csv-cache')
+CSV_CACHE_MAX_BYTES = int(os.environ.get('CSV_CACHE_MAX_BYTES', 1024 ** 3))
+
+
+def get_yesterday_directory():
+    """
+    Calculates the directory path for the previous day in YYYY/MM/DD format.
+    """
+    yesterday = date.today() - timedelta(days=1)
+    return yesterday.strftime("%Y/%m/%d")
+
+
+def get_today_directory():
+    """
+    Calculates the directory path for the current day in YYYY/MM/DD format.
+    """
+    return date.today().strftime("%Y/%m/%d")
+
+
+class SQLiteWatermarkStore:
+    """
+    Keeps the listing watermark for each prefix in a local SQLite file.
+
+    For every prefix it stores the last-seen key and the ETag of every object
+    already published, so a rerun only publishes new or changed objects.
+
+    Attributes:
+        path (str): The path of the SQLite database file.
+    """
+
+    def __init__(self, path=WATERMARK_SQLITE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS published "
+            "(prefix TEXT NOT NULL, key TEXT NOT NULL, etag TEXT NOT NULL, PRIMARY KEY (prefix, key)) WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS watermark (prefix TEXT PRIMARY KEY, last_key TEXT NOT NULL)")
+        self.conn.commit()
+
+    def get_last_key(self, prefix):
+        """
+        Returns the last-seen key for the prefix, or '' if nothing was published.
+        """
+        row = self.conn.execute("SELECT last_key FROM watermark WHERE prefix = ?", (prefix,)).fetchone()
+        return row[0] if row else ''
+
+    def get_published_etags(self, prefix):
+        """
+        Returns a dictionary of key -> ETag for every object published under the prefix.
+        """
+        return dict(self.conn.execute("SELECT key, etag FROM published WHERE prefix = ?", (prefix,)))
+
+    def record_published(self, prefix, keys, etags, last_key=None):
+        """
+        Marks objects as published and advances the last-seen key.
+
+        Args:
+            prefix: The listed prefix.
+            keys: The object keys that were published.
+            etags: The ETags of those objects, in the same order.
+            last_key: The new last-seen key, from PublishedKeys.mark. Every
+                listed key up to it must be published. None leaves it as is.
+        """
+        if not keys:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO published (prefix, key, etag) VALUES (?, ?, ?)",
+                [(prefix, key, etag) for key, etag in zip(keys, etags)],
+            )
+            if last_key is not None:
+                self.conn.execute(
+                    "INSERT INTO watermark (prefix, last_key) VALUES (?, ?) "
+                    "ON CONFLICT(prefix) DO UPDATE SET last_key = max(last_key, excluded.last_key)",
+                    (prefix, last_key),
+                )
+
+
+class RedisWatermarkStore:
+    """
+    Keeps the listing watermark for each prefix in Redis, so several hosts can share it.
+
+    The ETags live in one hash per prefix (key -> ETag) and the last-seen key in
+    a string next to it. Both expire after WATERMARK_TTL_SECONDS.
+
+    Attributes:
+        redis_client (redis.Redis): The connected Redis client object.
+    """
+
+    def __init__(self, redis_client, key_prefix=WATERMARK_REDIS_PREFIX, ttl_seconds=WATERMARK_TTL_SECONDS):
+        self.redis_client = redis_client
+        self.key_prefix = key_prefix
+        self.ttl_seconds = ttl_seconds
+        self._advance_last_key = redis_client.register_script(WATERMARK_MAX_LUA)
+
+    def _etags_key(self, prefix):
+        return f"{self.key_prefix}:{prefix}:etags"
+
+    def _last_key_key(self, prefix):
+        return f"{self.key_prefix}:{prefix}:last-key"
+
+    def get_last_key(self, prefix):
+        """
+        Returns the last-seen key for the prefix, or '' if nothing was published.
+        """
+        last_key = self.redis_client.get(self._last_key_key(prefix))
+        return last_key.decode('utf-8') if last_key else ''
+
+    def get_published_etags(self, prefix):
+        """
+        Returns a dictionary of key -> ETag for every object published under the prefix.
+        """
+        etags = {}
+        for key, etag in self.redis_client.hscan_iter(self._etags_key(prefix), count=10000):
+            etags[key.decode('utf-8')] = etag.decode('utf-8')
+        return etags
+
+    def record_published(self, prefix, keys, etags, last_key=None):
+        """
+        Marks objects as published and advances the last-seen key.
+
+        Args:
+            prefix: The listed prefix.
+            keys: The object keys that were published.
+            etags: The ETags of those objects, in the same order.
+            last_key: The new last-seen key, from PublishedKeys.mark. Every
+                listed key up to it must be published. None leaves it as is.
+        """
+        if not keys:
+            return
+        pipeline = self.redis_client.pipeline(transaction=True)
+        pipeline.hset(self._etags_key(prefix), mapping=dict(zip(keys, etags)))
+        pipeline.expire(self._etags_key(prefix), self.ttl_seconds)
+        if last_key is not None:
+            self._advance_last_key(keys=[self._last_key_key(prefix)], args=[last_key, self.ttl_seconds],
+                                   client=pipeline)
+        else:
+            pipeline.expire(self._last_key_key(prefix), self.ttl_seconds)
+        pipeline.execute()
+
+
+class PublishedKeys:
+    """
+    Tracks which of a prefix's listed keys were published, so the last-seen
+    key only advances over a contiguous run of published keys.
+
+    Batches are not published in key order (the streaming join follows
+    call.csv), so the largest key of a batch can be ahead of keys that are
+    still unpublished. Moving the watermark there would make a rerun with
+    INCREMENTAL_KEYS_ORDERED list past them and never publish them.
+
+    Attributes:
+        keys (list): The listed keys, sorted.
+        published (numpy.ndarray): One flag per key.
+    """
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.published = np.zeros(len(self.keys), dtype=bool)
+        self._next = 0
+
+    def mark(self, positions):
+        """
+        Flags keys as published.
+
+        Args:
+            positions: The positions of the published keys in `keys`.
+
+        Returns:
+            The last key of the published run starting at the first key, or
+            None if that run did not grow.
+        """
+        self.published[positions] = True
+        start = self._next
+        while self._next < len(self.keys) and self.published[self._next]:
+            self._next += 1
+        return self.keys[self._next - 1] if self._next > start else None
+
+
+def filter_new_objects(file_dataframe, published_etags):
+    """
+    Keeps only the objects that were never published or whose ETag changed.
+
+    Args:
+        file_dataframe: A DataFrame from list_s3_files.
+        published_etags: A dictionary of key -> ETag from a watermark store.
+
+    Returns:
+        The filtered DataFrame.
+    """
+    if not published_etags:
+        return file_dataframe
+    previous = file_dataframe['file_path'].map(published_etags)
+    return file_dataframe[previous.isna() | (previous != file_dataframe['etag'])]
+
+
+class S3ListingBuffer:
+    """
+    A compact, thread-safe columnar buffer of S3 object listings.
+
+    Attributes:
+        keys (list): Object keys.
+        sizes (array.array): Object sizes in bytes.
+        etags (list): Object ETags, without surrounding quotes.
+        last_modified (array.array): Last modified times as POSIX timestamps.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.sizes = array('q')
+        self.etags = []
+        self.last_modified = array('d')
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def extend(self, contents):
+        """
+        Appends one list_objects_v2 page of 'Contents' to the buffer.
+
+        Args:
+            contents: A list of object dictionaries from list_objects_v2.
+        """
+        keys = [obj['Key'] for obj in contents]
+        sizes = [obj['Size'] for obj in contents]
+        etags = [obj['ETag'].strip('"') for obj in contents]
+        last_modified = [obj['LastModified'].timestamp() for obj in contents]
+        with self._lock:
+            self.keys.extend(keys)
+            self.sizes.extend(sizes)
+            self.etags.extend(etags)
+            self.last_modified.extend(last_modified)
+
+    def __iter__(self):
+        """
+        Yields (key, size, etag, last_modified) tuples.
+        """
+        return zip(self.keys, self.sizes, self.etags, self.last_modified)
+
+    def to_dataframe(self):
+        """
+        Returns the listing as a Pandas DataFrame with 'file_path', 'filename',
+        'size', 'etag' and 'last_modified' columns.
+        """
+        file_paths = pd.Series(self.keys, dtype=object)
+        return pd.DataFrame({
+            'file_path': file_paths,
+            'filename': file_paths.str.rsplit('/', n=1).str[-1],
+            'size': np.frombuffer(self.sizes, dtype=np.int64) if self.sizes else np.empty(0, dtype=np.int64),
+            'etag': self.etags,
+            'last_modified': pd.to_datetime(np.frombuffer(self.last_modified, dtype=np.float64), unit='s', utc=True),
+        })
+
+
+def discover_listing_shards(s3_client, bucket_name, prefix, depth=LISTING_SHARD_DEPTH, start_after=''):
+    """
+    Splits a prefix into sub-prefixes (for example hour or vendor folders)
+    discovered with Delimiter='/'.
+
+    Args:
+        s3_client: A boto3 S3 client object.
+        bucket_name: The name of the S3 bucket.
+        prefix: The prefix to split. A trailing '/' is added if missing.
+        depth: How many folder levels to descend while discovering shards.
+        start_after: Only list keys that sort after this key.
+
+    Returns:
+        A tuple (shards, direct_contents). shards lists the sub-prefixes to page
+        in full. direct_contents lists the objects found directly under the
+        discovered levels, which are not covered by any shard.
+    """
+    shards = [prefix.rstrip('/') + '/'] if prefix else ['']
+    direct_contents = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for _ in range(depth):
+        next_level = []
+        for shard in shards:
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=shard, Delimiter='/', StartAfter=start_after):
+                direct_contents.extend(page.get('Contents', []))
+                next_level.extend(common['Prefix'] for common in page.get('CommonPrefixes', []))
+        if not next_level:
+            return [], direct_contents
+        shards = next_level
+    return shards, direct_contents
+
+
+def list_s3_files_parallel(s3_client, bucket_name, prefix, max_workers=LISTING_MAX_WORKERS,
+                           depth=LISTING_SHARD_DEPTH, start_after=''):
+    """
+    Lists every object under a prefix by paging its shards concurrently.
+
+    Every shard is paged until it is no longer truncated, so nothing is dropped
+    after the first 1000 keys.
+
+    Args:
+        s3_client: A boto3 S3 client object. Clients are thread-safe; size its
+            max_pool_connections to at least max_workers.
+        bucket_name: The name of the S3 bucket.
+        prefix: The prefix to list.
+        max_workers: The number of shards paged at the same time.
+        depth: How many folder levels to descend while discovering shards.
+        start_after: Only list keys that sort after this key.
+
+    Returns:
+        An S3ListingBuffer with one entry per object.
+    """
+    buffer = S3ListingBuffer()
+    shards, direct_contents = discover_listing_shards(s3_client, bucket_name, prefix, depth, start_after)
+    buffer.extend(direct_contents)
+
+    def list_shard(shard):
+        paginator = s3_client.get_paginator('list_objects_v2')
+        listed = 0
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=shard, StartAfter=start_after):
+            contents = page.get('Contents', [])
+            buffer.extend(contents)
+            listed += len(contents)
+        return listed
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(list_shard, shard): shard for shard in shards}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error listing shard s3://{bucket_name}/{futures[future]}: {e}")
+                raise
+    return buffer
+
+
+def list_s3_files(s3_client, bucket_name, directory, start_after=''):
+    """
+    Lists all files within the specified directory in the S3 bucket.
+
+    Args:
+        s3_client: A boto3 S3 client object.
+        bucket_name: The name of the S3 bucket.
+        directory: The directory path within the S3 bucket.
+        start_after: Only list keys that sort after this key.
+
+    Returns:
+        A Pandas DataFrame with 'file_path', 'filename', 'size', 'etag' and
+        'last_modified' columns.
+    """
+    started = time.perf_counter()
+    buffer = list_s3_files_parallel(s3_client, bucket_name, directory, start_after=start_after)
+    print(f"Listed {len(buffer)} objects under s3://{bucket_name}/{directory} in {time.perf_counter() - started:.2f} s")
+    return buffer.to_dataframe()
+
+
+def read_s3_csv(s3_client, bucket_name, file_path, cache=None, **read_kwargs):
+    """
+    Reads a CSV file from S3 as a Pandas DataFrame.
+
+    Args:
+        s3_client: A boto3 S3 client object.
+        bucket_name: The name of the S3 bucket.
+        file_path: The key of the CSV file in S3.
+        cache: An optional CsvFrameCache; the file is only downloaded when its ETag changed.
+        read_kwargs: Extra keyword arguments for pd.read_csv.
+
+    Returns:
+        A Pandas DataFrame containing the CSV data, or None on error.
+    """
+    try:
+        if cache is not None:
+            return cache.read_csv(s3_client, bucket_name, file_path, **read_kwargs)
+        response = s3_client.get_object(Bucket=bucket_name, Key=file_path)
+        return pd.read_csv(response['Body'], **read_kwargs)
+    except Exception as e:
+        print(f"Error reading CSV from S3: {e}")
+        return None
+
+
+def connect_to_redis():
+    """
+    Establishes a connection to the Redis server.
+
+    Returns:
+        A Redis client object.
+    """
+    try:
+        redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD)
+        redis_client.ping()
+        return redis_client
+    except redis.exceptions.ConnectionError as e:
+        print(f"Error connecting to Redis: {e}")
+        exit(1)
+
+
+def publish_records_batched(redis_client, records, stream_name=REDISTREAM_KEY,
+                            batch_size=PUBLISH_BATCH_SIZE, transaction=PUBLISH_TRANSACTION):
+    """
+    Publishes records to a Redis stream in chunks, one pipeline round trip per chunk.
+
+    Args:
+        redis_client: A Redis client object.
+        records: An iterable of dictionaries to XADD to the stream.
+        stream_name: The name of the Redis stream to write to.
+        batch_size: The number of records sent per pipeline.
+        transaction: Wrap each pipeline in MULTI/EXEC when True. The default
+            MULTI-less pipeline is faster and is enough for independent XADDs.
+
+    Returns:
+        A dictionary with the number of records and batches published,
+        the total elapsed seconds and the overall records per second.
+    """
+    published = 0
+    batches = 0
+    started = time.perf_counter()
+    pipeline = redis_client.pipeline(transaction=transaction)
+    pending = 0
+
+    def flush():
+        nonlocal published, batches, pending
+        batch_started = time.perf_counter()
+        try:
+            pipeline.execute()
+        except redis.RedisError as e:
+            print(f"Error publishing batch {batches + 1} to stream {stream_name}: {e}")
+            raise
+        elapsed = time.perf_counter() - batch_started
+        published += pending
+        batches += 1
+        rate = pending / elapsed if elapsed > 0 else float('inf')
+        print(f"Batch {batches}: {pending} records to {stream_name} in {elapsed * 1000:.1f} ms ({rate:,.0f} records/s)")
+        pending = 0
+
+    for record in records:
+        pipeline.xadd(stream_name, record)
+        pending += 1
+        if pending >= batch_size:
+            flush()
+    if pending:
+        flush()
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        'records': published,
+        'batches': batches,
+        'seconds': elapsed,
+        'records_per_second': published / elapsed if elapsed > 0 else 0.0,
+    }
+    print(f"Published {published} records in {batches} batches to {stream_name} "
+          f"in {elapsed:.2f} s ({stats['records_per_second']:,.0f} records/s)")
+    return stats
+
+
+# Lookup table used to hex-encode random UUID bytes without a Python loop
+HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+UUID_DASH_POSITIONS = [8, 12, 16, 20]
+
+
+def generate_uuid4_column(count):
+    """
+    Generates `count` random version 4 UUID strings in one vectorized pass.
+
+    Args:
+        count: The number of UUIDs to generate.
+
+    Returns:
+        A NumPy array of UUID strings, formatted like str(uuid.uuid4()).
+    """
+    raw = np.frombuffer(os.urandom(16 * count), dtype=np.uint8).reshape(count, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+
+    hex_chars = np.empty((count, 32), dtype=np.uint8)
+    hex_chars[:, 0::2] = HEX_DIGITS[raw >> 4]
+    hex_chars[:, 1::2] = HEX_DIGITS[raw & 0x0F]
+    with_dashes = np.insert(hex_chars, UUID_DASH_POSITIONS, ord('-'), axis=1)
+    return np.ascontiguousarray(with_dashes).view('S36').ravel().astype(str)
+
+
+def build_redistream_frame(dataframe):
+    """
+    Builds the RediStream record columns for a whole DataFrame at once.
+
+    Args:
+        dataframe: A Pandas DataFrame with 'filename' and 'file_path' columns
+            and optional 'agent_racf' and 'call_date' columns.
+
+    Returns:
+        A Pandas DataFrame with one column per record field.
+    """
+    count = len(dataframe)
+    empty = pd.Series('', index=dataframe.index, dtype=object)
+    agent_racf = dataframe['agent_racf'] if 'agent_racf' in dataframe else empty
+    call_date = dataframe['call_date'] if 'call_date' in dataframe else empty
+
+    return pd.DataFrame({
+        'id': generate_uuid4_column(count),
+        'filename': dataframe['filename'].to_numpy(dtype=object),
+        's3-file-path': (f"s3://{S3_BUCKET_NAME}/" + dataframe['file_path'].astype(str)).to_numpy(dtype=object),
+        'agent_racf': agent_racf.astype(object).where(agent_racf.notna(), '').astype(str).to_numpy(dtype=object),
+        'calldate': call_date.astype(object).where(call_date.notna(), '').astype(str).to_numpy(dtype=object),
+    })
+
+
+def iter_redistream_records(record_frame):
+    """
+    Yields one record dictionary per row by zipping the frame's columns.
+    This is several times faster than DataFrame.to_dict('records') and does
+    not materialise the whole list of records.
+
+    Args:
+        record_frame: A DataFrame built by build_redistream_frame.
+
+    Yields:
+        A dictionary per row, keyed by column name.
+    """
+    columns = list(record_frame.columns)
+    for values in zip(*(record_frame[column].to_numpy() for column in columns)):
+        yield dict(zip(columns, values))
+
+
+def create_redistream_record(dataframe, redis_client=None, batch_size=PUBLISH_BATCH_SIZE):
+    """
+    Creates a list of records for the RediStream and optionally publishes them.
+
+    Args:
+        dataframe: A Pandas DataFrame containing file, call and agent data.
+        redis_client: A Redis client object. When given, the records are
+            published to REDISTREAM_KEY with publish_records_batched.
+        batch_size: The number of records sent per pipeline.
+
+    Returns:
+        A list of records.
+    """
+    records = list(iter_redistream_records(build_redistream_frame(dataframe)))
+    if redis_client is not None:
+        publish_records_batched(redis_client, records, batch_size=batch_size)
+    return records
+
+
+def create_redistream_record_rowwise(dataframe):
+    """
+    Row-at-a-time record builder kept as the baseline for benchmark_record_builders.
+
+    Args:
+        dataframe: A Pandas DataFrame containing file, call and agent data.
+
+    Returns:
+        A list of records.
+    """
+    records = []
+    for _, row in dataframe.iterrows():
+        record = {
+            'id': str(uuid.uuid4()),
+            'filename': row['filename'],
+            's3-file-path': f"s3://{S3_BUCKET_NAME}/{row['file_path']}",
+            'agent_racf': '' if pd.isna(row.get('agent_racf')) else str(row['agent_racf']),
+            'calldate': '' if pd.isna(row.get('call_date')) else str(row['call_date']),
+        }
+        records.append(record)
+    return records
+
+
+def benchmark_record_builders(n_rows=1_000_000):
+    """
+    Times the row-wise and vectorized record builders on a synthetic DataFrame.
+
+    Args:
+        n_rows: The number of synthetic rows to build records for.
+
+    Returns:
+        A dictionary with the seconds taken by each builder and the speedup.
+    """
+    dataframe = pd.DataFrame({
+        'filename': [f"ACT_{i:08d}.wav" for i in range(n_rows)],
+        'file_path': [f"recordings/2024/01/01/ACT_{i:08d}.wav" for i in range(n_rows)],
+        'agent_racf': pd.Series([f"R{i % 5000:05d}" for i in range(n_rows)], dtype='category'),
+        'call_date': ['2024-01-01 10:30:00'] * n_rows,
+    })
+
+    started = time.perf_counter()
+    create_redistream_record_rowwise(dataframe)
+    rowwise_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    create_redistream_record(dataframe)
+    vectorized_seconds = time.perf_counter() - started
+
+    speedup = rowwise_seconds / vectorized_seconds
+    print(f"{n_rows:,} rows: iterrows {rowwise_seconds:.2f} s, vectorized {vectorized_seconds:.2f} s ({speedup:.1f}x)")
+    return {'rowwise_seconds': rowwise_seconds, 'vectorized_seconds': vectorized_seconds, 'speedup': speedup}
+
+
+def build_roster_index(s3_client, bucket_name, file_path, cache=None):
+    """
+    Reads agent-roster.csv into a hash index of ID -> agent_racf.
+
+    Args:
+        s3_client: A boto3 S3 client object.
+        bucket_name: The name of the S3 bucket.
+        file_path: The key of agent-roster.csv in S3.
+        cache: An optional CsvFrameCache for the parsed roster.
+
+    Returns:
+        A DataFrame indexed by ID with a categorical 'agent_racf' column.
+    """
+    read_kwargs = {'usecols': list(ROSTER_CSV_DTYPES), 'dtype': ROSTER_CSV_DTYPES}
+    if cache is not None:
+        roster = cache.read_csv(s3_client, bucket_name, file_path, **read_kwargs)
+    else:
+        response = s3_client.get_object(Bucket=bucket_name, Key=file_path)
+        roster = pd.read_csv(response['Body'], **read_kwargs)
+    return roster.drop_duplicates('ID').set_index('ID')
+
+
+def stream_call_chunks(s3_client, bucket_name, file_path, chunksize=CALL_CSV_CHUNK_SIZE):
+    """
+    Streams call.csv from the S3 body in chunks instead of reading it whole.
+
+    Args:
+        s3_client: A boto3 S3 client object.
+        bucket_name: The name of the S3 bucket.
+        file_path: The key of call.csv in S3.
+        chunksize: The number of rows per chunk.
+
+    Returns:
+        An iterator of DataFrames with the CALL_CSV_DTYPES columns.
+    """
+    response = s3_client.get_object(Bucket=bucket_name, Key=file_path)
+    return pd.read_csv(response['Body'], usecols=list(CALL_CSV_DTYPES), dtype=CALL_CSV_DTYPES, chunksize=chunksize)
+
+
+def stream_join_and_publish(s3_client, redis_client, prefix, file_dataframe, store=None,
+                            batch_size=PUBLISH_BATCH_SIZE, chunksize=CALL_CSV_CHUNK_SIZE, csv_cache=None):
+    """
+    Joins call.csv and agent-roster.csv with the listed files chunk by chunk and
+    publishes each joined chunk straight away, so memory stays flat however
+    large call.csv is.
+
+    The output matches the in-memory merge: call rows are inner-joined with the
+    roster on ID, then left-joined from the files on file_name. Files without a
+    call row are published last with empty agent fields, except with a
+    watermark store: there they are held back and not recorded, so a later
+    run publishes them once call.csv has their row.
+
+    Args:
+        s3_client: A boto3 S3 client object.
+        redis_client: A Redis client object.
+        prefix: The S3 prefix of the day's recordings.
+        file_dataframe: A DataFrame from list_s3_files.
+        store: An optional watermark store to record published batches in.
+        batch_size: The number of records sent per pipeline.
+        chunksize: The number of call.csv rows per chunk.
+        csv_cache: An optional CsvFrameCache for agent-roster.csv.
+
+    Returns:
+        The number of records published.
+    """
+    roster_index = build_roster_index(s3_client, S3_BUCKET_NAME, f"{prefix}/agent-roster.csv", csv_cache)
+    file_dataframe = file_dataframe.sort_values('file_path', ignore_index=True)
+    files_index = file_dataframe[['filename', 'file_path', 'etag']].assign(position=np.arange(len(file_dataframe)))
+    files_index = files_index.set_index('filename')
+    matched = np.zeros(len(file_dataframe), dtype=bool)
+    published_keys = PublishedKeys(file_dataframe['file_path'])
+
+    def publish(joined, positions):
+        create_redistream_record(joined, redis_client, batch_size)
+        if store is not None:
+            store.record_published(prefix, joined['file_path'].tolist(), joined['etag'].tolist(),
+                                   published_keys.mark(positions))
+        return len(joined)
+
+    published = 0
+    for chunk in stream_call_chunks(s3_client, S3_BUCKET_NAME, f"{prefix}/call.csv", chunksize):
+        joined = chunk.join(roster_index, on='ID', how='inner')
+        joined = joined.join(files_index, on='file_name', how='inner')
+        if joined.empty:
+            continue
+        joined = joined.rename(columns={'file_name': 'filename'})
+        positions = joined['position'].to_numpy()
+        matched[positions] = True
+        published += publish(joined, positions)
+
+    unmatched = file_dataframe[~matched]
+    if unmatched.empty:
+        return published
+    if store is not None:
+        print(f"{len(unmatched)} recordings under {prefix} have no call.csv row yet, held back.")
+        return published
+    return published + publish(unmatched, np.flatnonzero(~matched))
+
+
+def ingest_directory(s3_client, redis_client, prefix, store=None, batch_size=PUBLISH_BATCH_SIZE, csv_cache=None):
+    """
+    Publishes one record per recording under a prefix to the gwas-recordings stream.
+
+    Args:
+        s3_client: A boto3 S3 client object.
+        redis_client: A Redis client object.
+        prefix: The S3 prefix of the day's recordings.
+        store: An optional watermark store. When given, only new or changed
+            objects are published and each published batch is recorded.
+            Recordings without a call.csv row are held back until it arrives.
+        batch_size: The number of records sent per pipeline.
+        csv_cache: An optional CsvFrameCache for agent-roster.csv.
+
+    Returns:
+        The number of records published.
+    """
+    start_after = store.get_last_key(prefix) if store is not None and INCREMENTAL_KEYS_ORDERED else ''
+    file_dataframe = list_s3_files(s3_client, S3_BUCKET_NAME, prefix, start_after=start_after)
+    if file_dataframe.empty:
+        return 0
+    file_dataframe = file_dataframe[file_dataframe['filename'].str.lower().str.endswith(RECORDING_EXTENSION)]
+    if store is not None:
+        file_dataframe = filter_new_objects(file_dataframe, store.get_published_etags(prefix))
+    if file_dataframe.empty:
+        print(f"No new recordings under {prefix}.")
+        return 0
+
+    if JOIN_MODE == 'streaming':
+        try:
+            return stream_join_and_publish(s3_client, redis_client, prefix, file_dataframe, store, batch_size,
+                                           csv_cache=csv_cache)
+        except s3_client.exceptions.NoSuchKey:
+            print(f"Missing call.csv or agent-roster.csv under {prefix}, nothing published.")
+            return 0
+
+    call_data = read_s3_csv(s3_client, S3_BUCKET_NAME, f"{prefix}/call.csv")
+    agent_roster = read_s3_csv(s3_client, S3_BUCKET_NAME, f"{prefix}/agent-roster.csv", csv_cache)
+    if call_data is None or agent_roster is None:
+        print(f"Missing call.csv or agent-roster.csv under {prefix}, nothing published.")
+        return 0
+
+    call_dataframe = call_data.merge(agent_roster, on='ID')[['agent_racf', 'call_date', 'file_name']]
+    file_dataframe = file_dataframe.sort_values('file_path', ignore_index=True)
+    file_dataframe['position'] = np.arange(len(file_dataframe))
+    result_dataframe = file_dataframe.merge(call_dataframe, left_on='filename', right_on='file_name', how='left')
+
+    if store is None:
+        return len(create_redistream_record(result_dataframe, redis_client, batch_size))
+
+    # A recording without a call row yet is left unpublished and unrecorded, so a later run
+    # publishes it with its agent fields; it also holds the last-seen key back
+    unmatched = result_dataframe['file_name'].isna()
+    if unmatched.any():
+        print(f"{unmatched.sum()} recordings under {prefix} have no call.csv row yet, held back.")
+        result_dataframe = result_dataframe[~unmatched]
+
+    # Record each batch right after it is published, so a failed run resumes where it stopped.
+    # Batches follow key order, so the last-seen key never passes an unpublished key.
+    published_keys = PublishedKeys(file_dataframe['file_path'])
+    published = 0
+    for start in range(0, len(result_dataframe), batch_size):
+        chunk = result_dataframe.iloc[start:start + batch_size]
+        create_redistream_record(chunk, redis_client, batch_size)
+        store.record_published(prefix, chunk['file_path'].tolist(), chunk['etag'].tolist(),
+                               published_keys.mark(chunk['position'].to_numpy()))
+        published += len(chunk)
+    return published
+
+
+def main():
+    """
+    Lists the day's recordings, joins them with the call data and publishes
+    one record per file to the gwas-recordings stream.
+
+    In 'full' mode yesterday's directory is published as a whole. In
+    'incremental' mode, meant to run every few minutes, yesterday's and
+    today's directories are checked against the watermark store and only
+    new or changed recordings are published.
+    """
+    try:
+        s3_client = boto3.client('s3', config=Config(max_pool_connections=LISTING_MAX_WORKERS))
+        redis_client = connect_to_redis()
+
+        incremental = INGEST_MODE == 'incremental' or sys.argv[1:2] == ['incremental']
+        if incremental:
+            directories = [get_yesterday_directory(), get_today_directory()]
+            if WATERMARK_BACKEND == 'redis':
+                store = RedisWatermarkStore(redis_client)
+            else:
+                store = SQLiteWatermarkStore(WATERMARK_SQLITE_PATH)
+        else:
+            directories = [get_yesterday_directory()]
+            store = None
+
+        csv_cache = CsvFrameCache(CSV_CACHE_DIR, CSV_CACHE_MAX_BYTES) if CSV_CACHE_DIR else None
+
+        for directory in directories:
+            prefix = f"{S3_ROOT_DIR}/{directory}" if S3_ROOT_DIR else directory
+            published = ingest_directory(s3_client, redis_client, prefix, store, csv_cache=csv_cache)
+            print(f"Successfully processed {published} files from S3 directory {prefix}.")
+        if csv_cache is not None:
+            print(f"Reference CSV cache: {csv_cache.stats()}")
+    except Exception as e:
+        print(f"Error occurred: {e}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['benchmark']:
+        benchmark_record_builders(int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000)
+    else:
+        main()
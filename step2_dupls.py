@@ -179,3 +179,528 @@ def main():
 
 if __name__ == "__main__":
     main()
+
+
+===============
+
+
+import os
+import sys
+import time
+import socket
+import signal
+import json
+import redis
+from dotenv import load_dotenv
+
+# Load environment variables from a `.env` file
+load_dotenv()
+
+# Redis connection details from environment variables
+REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
+REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+REDIS_PASSWORD = os.getenv('REDIS_PASSWORD')
+
+# Redis stream names
+SOURCE_STREAM = "gwas-recordings"
+TARGET_STREAMS = ["gwas-converter", "gwas-transcription"]
+
+# Consumer group settings
+FANOUT_GROUP = os.getenv('FANOUT_GROUP', 'gwas-fanout')
+# The same name after a restart, so the startup replay finds the previous process's pending messages
+FANOUT_CONSUMER = os.getenv('FANOUT_CONSUMER', socket.gethostname())
+FANOUT_BATCH_SIZE = int(os.getenv('FANOUT_BATCH_SIZE', 1000))
+FANOUT_BLOCK_MS = int(os.getenv('FANOUT_BLOCK_MS', 5000))
+# Messages left pending this long by a dead consumer are claimed and fanned out again
+FANOUT_CLAIM_IDLE_MS = int(os.getenv('FANOUT_CLAIM_IDLE_MS', 60000))
+
+# Optional JSON routing table; without it every message goes to every target stream.
+# Example:
+# {"routes": [
+#     {"target": "gwas-converter"},
+#     {"target": "gwas-transcription",
+#      "match": {"vendor": ["ACT"], "extension": [".wav"],
+#                "calldate": {"from": "2024-01-01", "to": "2024-12-31 23:59:59"}}}
+# ]}
+FANOUT_ROUTES_FILE = os.getenv('FANOUT_ROUTES_FILE')
+
+# 'pipeline' reads through the consumer group and copies client-side,
+# 'lua' runs FANOUT_LUA so reads and copies happen server-side
+FANOUT_MODE = os.getenv('FANOUT_MODE', 'pipeline')
+FANOUT_LUA_BATCH_SIZE = int(os.getenv('FANOUT_LUA_BATCH_SIZE', 500))
+FANOUT_LUA_IDLE_SLEEP = float(os.getenv('FANOUT_LUA_IDLE_SLEEP', 0.2))
+FANOUT_CURSOR_KEY = f"{SOURCE_STREAM}:fanout-cursor"
+
+# Reads up to ARGV[1] entries after the stored cursor, XADDs each one to every
+# target stream and advances the cursor, all atomically on the server.
+# KEYS[1] = source stream, KEYS[2] = cursor key, KEYS[3..n] = target streams.
+# On Redis Cluster every key must hash to the same slot (use a {hash-tag}).
+# Needs Redis >= 6.2 for the exclusive '(' range start.
+FANOUT_LUA = """
+local cursor = redis.call('GET', KEYS[2]) or '0-0'
+local entries = redis.call('XRANGE', KEYS[1], '(' .. cursor, '+', 'COUNT', tonumber(ARGV[1]))
+for _, entry in ipairs(entries) do
+    for i = 3, #KEYS do
+        redis.call('XADD', KEYS[i], '*', unpack(entry[2]))
+    end
+end
+if #entries > 0 then
+    cursor = entries[#entries][1]
+    redis.call('SET', KEYS[2], cursor)
+end
+return {#entries, cursor}
+"""
+
+running = True
+
+
+def stop(signum, frame):
+    """Signal handler that lets the current batch finish before exiting."""
+    global running
+    running = False
+
+
+def connect_to_redis():
+    """
+    Establishes a connection to the Redis server.
+
+    Returns:
+        A Redis client object.
+    """
+    try:
+        redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD)
+        redis_client.ping()
+        return redis_client
+    except redis.exceptions.ConnectionError as e:
+        print(f"Error connecting to Redis: {e}")
+        exit(1)
+
+
+def ensure_consumer_group(redis_client, stream_name, group_name):
+    """
+    Creates the consumer group (and the stream) if it does not exist yet.
+
+    Args:
+        redis_client: A Redis client object.
+        stream_name: The name of the Redis stream.
+        group_name: The name of the consumer group.
+    """
+    try:
+        redis_client.xgroup_create(stream_name, group_name, id='0', mkstream=True)
+    except redis.exceptions.ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+def read_batch(redis_client, stream_id='>', count=FANOUT_BATCH_SIZE, block=FANOUT_BLOCK_MS,
+               source_stream=SOURCE_STREAM, group_name=FANOUT_GROUP):
+    """
+    Reads a batch of messages from the source stream through the consumer group.
+
+    Args:
+        redis_client: A Redis client object.
+        stream_id: '>' for new messages, or '0' to re-read this consumer's pending ones.
+        count: The maximum number of messages to read.
+        block: Milliseconds to block waiting for new messages.
+        source_stream: The name of the stream to read from.
+        group_name: The name of the consumer group.
+
+    Returns:
+        A list of (message_id, fields) tuples.
+    """
+    response = redis_client.xreadgroup(
+        group_name, FANOUT_CONSUMER, {source_stream: stream_id},
+        count=count, block=None if stream_id != '>' else block
+    )
+    if not response:
+        return []
+    return response[0][1]
+
+
+def claim_stale_messages(redis_client, start_id='0-0', count=FANOUT_BATCH_SIZE):
+    """
+    Claims messages left pending by consumers that stopped before acknowledging them.
+
+    Args:
+        redis_client: A Redis client object.
+        start_id: The cursor returned by the previous call, '0-0' to start a new scan.
+        count: The maximum number of messages to scan.
+
+    Returns:
+        A tuple (next_start_id, messages). messages is a list of
+        (message_id, fields) tuples now owned by this consumer; next_start_id
+        is '0-0' once the whole pending list was scanned.
+    """
+    response = redis_client.xautoclaim(
+        SOURCE_STREAM, FANOUT_GROUP, FANOUT_CONSUMER, FANOUT_CLAIM_IDLE_MS, start_id=start_id, count=count
+    )
+    next_start_id = response[0].decode('utf-8') if isinstance(response[0], bytes) else response[0]
+    return next_start_id, response[1]
+
+
+class RoutingTable:
+    """
+    Maps each message to the target streams whose predicates it matches.
+
+    Predicates are compiled once into byte-string lookups, so routing a
+    message takes a few dictionary and set lookups with no decoding or
+    parsing. Messages must come from a client without decode_responses.
+
+    Supported predicates in a route's "match" object:
+        <field>: [values]  the field equals one of the values
+        extension: [exts]  the filename extension is one of exts (case-insensitive)
+        <field>: {"from": lo, "to": hi}  lo <= field <= hi, compared as strings
+            (ISO dates and timestamps sort correctly)
+
+    Attributes:
+        routes (list): (target_stream, checks) tuples in config order.
+        targets (list): Every target stream named in the table.
+        copies (dict): Copies written per target stream, counted by record().
+        unrouted (int): Messages that matched no route, counted by record().
+
+    Raises:
+        ValueError: The routes are not in the format above.
+    """
+
+    def __init__(self, routes):
+        if not isinstance(routes, list):
+            raise ValueError("'routes' must be a list")
+        self.routes = []
+        for position, route in enumerate(routes):
+            if not isinstance(route, dict) or not isinstance(route.get('target'), str) or not route['target']:
+                raise ValueError(f"route {position}: 'target' must be a non-empty string")
+            match = route.get('match', {})
+            if not isinstance(match, dict):
+                raise ValueError(f"route {position}: 'match' must be an object")
+            self.routes.append((route['target'], self._compile(match, position)))
+        self.targets = list(dict.fromkeys(target for target, _ in self.routes))
+        self.copies = dict.fromkeys(self.targets, 0)
+        self.unrouted = 0
+
+    @staticmethod
+    def _strings(condition, position, field):
+        values = [condition] if isinstance(condition, str) else condition
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            raise ValueError(f"route {position}: '{field}' must be a string or a list of strings")
+        return values
+
+    @classmethod
+    def _compile(cls, match, position):
+        checks = []
+        for field, condition in match.items():
+            if field == 'extension':
+                extensions = frozenset(ext.lower().lstrip('.').encode('utf-8')
+                                       for ext in cls._strings(condition, position, field))
+                checks.append(('extension', b'filename', extensions))
+            elif isinstance(condition, dict):
+                if set(condition) - {'from', 'to'}:
+                    raise ValueError(f"route {position}: range '{field}' only takes 'from' and 'to'")
+                low = condition.get('from')
+                high = condition.get('to')
+                if not all(bound is None or isinstance(bound, str) for bound in (low, high)):
+                    raise ValueError(f"route {position}: range '{field}' bounds must be strings")
+                checks.append(('range', field.encode('utf-8'),
+                               (low.encode('utf-8') if low else None, high.encode('utf-8') if high else None)))
+            else:
+                values = cls._strings(condition, position, field)
+                checks.append(('in', field.encode('utf-8'), frozenset(v.encode('utf-8') for v in values)))
+        return tuple(checks)
+
+    @staticmethod
+    def _matches(fields, checks):
+        for kind, field, expected in checks:
+            value = fields.get(field)
+            if value is None:
+                return False
+            if kind == 'in':
+                if value not in expected:
+                    return False
+            elif kind == 'extension':
+                if value.rpartition(b'.')[2].lower() not in expected:
+                    return False
+            else:
+                low, high = expected
+                if (low is not None and value < low) or (high is not None and value > high):
+                    return False
+        return True
+
+    def route(self, fields):
+        """
+        Returns the target streams for one message.
+
+        Args:
+            fields: The message fields, with bytes keys and values.
+
+        Returns:
+            A list of target stream names, possibly empty.
+        """
+        return [target for target, checks in self.routes if self._matches(fields, checks)]
+
+    def record(self, routed):
+        """
+        Counts the copies of a batch once it was written, so a batch that
+        fails and is delivered again is only counted when it succeeds.
+
+        Args:
+            routed: The target lists returned by route(), one per message.
+        """
+        for targets in routed:
+            if not targets:
+                self.unrouted += 1
+            for target in targets:
+                self.copies[target] += 1
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Loads and compiles a routing table from a JSON file.
+
+        Args:
+            path: The path of the JSON file.
+
+        Returns:
+            A RoutingTable.
+
+        Raises:
+            ValueError: The file is not valid JSON or not a valid routing table.
+        """
+        with open(path) as routes_file:
+            config = json.load(routes_file)
+        if not isinstance(config, dict) or 'routes' not in config:
+            raise ValueError("the top-level object must have a 'routes' list")
+        return cls(config['routes'])
+
+
+def fan_out_batch(redis_client, messages, target_streams=TARGET_STREAMS,
+                  source_stream=SOURCE_STREAM, group_name=FANOUT_GROUP, routing_table=None):
+    """
+    Copies a batch of messages to their target streams in one pipeline and
+    acknowledges them only once the pipeline succeeded.
+
+    If the pipeline fails the messages stay pending and are delivered again,
+    so every message reaches every target at least once. Entries deleted
+    from the source stream while pending come back with no fields; they are
+    acknowledged without a copy.
+
+    Args:
+        redis_client: A Redis client object.
+        messages: A list of (message_id, fields) tuples.
+        target_streams: The names of the streams to copy to.
+        source_stream: The name of the stream the messages were read from.
+        group_name: The name of the consumer group to acknowledge in.
+        routing_table: An optional RoutingTable. When given, each message only
+            goes to the targets it routes to and target_streams is ignored.
+            Messages that match no route are acknowledged without a copy.
+
+    Returns:
+        The number of messages fanned out.
+    """
+    if not messages:
+        return 0
+    pipeline = redis_client.pipeline(transaction=False)
+    routed = []
+    for _, fields in messages:
+        if not fields:
+            continue
+        targets = routing_table.route(fields) if routing_table is not None else target_streams
+        routed.append(targets)
+        for target_stream in targets:
+            pipeline.xadd(target_stream, fields)
+    pipeline.execute()
+    redis_client.xack(source_stream, group_name, *[message_id for message_id, _ in messages])
+    if routing_table is not None:
+        routing_table.record(routed)
+    return len(messages)
+
+
+def run_fanout(redis_client, routing_table=None):
+    """
+    Fans out gwas-recordings until stopped: first this consumer's pending
+    messages from a previous run, then new messages in FANOUT_BATCH_SIZE batches.
+
+    Args:
+        redis_client: A Redis client object.
+        routing_table: An optional RoutingTable to route each message with.
+    """
+    ensure_consumer_group(redis_client, SOURCE_STREAM, FANOUT_GROUP)
+
+    # Recover messages delivered to this consumer but never acknowledged
+    while running:
+        try:
+            pending = read_batch(redis_client, stream_id='0')
+            if not pending:
+                break
+            fan_out_batch(redis_client, pending, routing_table=routing_table)
+        except redis.RedisError as e:
+            print(f"Error replaying pending messages, retrying: {e}")
+            time.sleep(1)
+
+    claim_cursor = '0-0'
+    last_claim = time.monotonic()
+    while running:
+        try:
+            if time.monotonic() - last_claim > FANOUT_CLAIM_IDLE_MS / 1000:
+                claim_cursor, claimed = claim_stale_messages(redis_client, claim_cursor)
+                fan_out_batch(redis_client, claimed, routing_table=routing_table)
+                last_claim = time.monotonic()
+
+            started = time.perf_counter()
+            messages = read_batch(redis_client)
+            copied = fan_out_batch(redis_client, messages, routing_table=routing_table)
+            if copied:
+                elapsed = time.perf_counter() - started
+                print(f"Fanned out {copied} messages in {elapsed * 1000:.1f} ms ({copied / elapsed:,.0f} messages/s)")
+                if routing_table is not None:
+                    print(f"Routed copies per target: {routing_table.copies}, unrouted: {routing_table.unrouted}")
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis connection error, retrying: {e}")
+            time.sleep(1)
+        except redis.RedisError as e:
+            print(f"Error fanning out batch, messages stay pending: {e}")
+            time.sleep(1)
+
+
+def register_fanout_script(redis_client):
+    """
+    Registers FANOUT_LUA with Redis.
+
+    Args:
+        redis_client: A Redis client object.
+
+    Returns:
+        A callable Script; it runs EVALSHA and reloads the script on NOSCRIPT.
+    """
+    return redis_client.register_script(FANOUT_LUA)
+
+
+def lua_fan_out_batch(fanout_script, count=FANOUT_LUA_BATCH_SIZE, source_stream=SOURCE_STREAM,
+                      cursor_key=FANOUT_CURSOR_KEY, target_streams=TARGET_STREAMS):
+    """
+    Runs one server-side fan-out step.
+
+    Args:
+        fanout_script: The Script returned by register_fanout_script.
+        count: The maximum number of entries copied. The script blocks Redis while
+            it runs, so keep this in the hundreds.
+        source_stream: The name of the stream to copy from.
+        cursor_key: The key holding the ID of the last entry copied.
+        target_streams: The names of the streams to copy to.
+
+    Returns:
+        A tuple (copied, cursor) with the number of entries copied and the new cursor.
+    """
+    copied, cursor = fanout_script(keys=[source_stream, cursor_key, *target_streams], args=[count])
+    return copied, cursor.decode('utf-8') if isinstance(cursor, bytes) else cursor
+
+
+def run_lua_fanout(redis_client):
+    """
+    Fans out gwas-recordings with FANOUT_LUA until stopped.
+
+    The script keeps its own cursor, so this mode does not use the consumer
+    group. Scripts cannot block, so the loop sleeps when it has caught up.
+
+    Args:
+        redis_client: A Redis client object.
+    """
+    fanout_script = register_fanout_script(redis_client)
+    while running:
+        try:
+            started = time.perf_counter()
+            copied, cursor = lua_fan_out_batch(fanout_script)
+            if not copied:
+                time.sleep(FANOUT_LUA_IDLE_SLEEP)
+                continue
+            elapsed = time.perf_counter() - started
+            print(f"Fanned out {copied} messages up to {cursor} server-side in {elapsed * 1000:.1f} ms "
+                  f"({copied / elapsed:,.0f} messages/s)")
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis connection error, retrying: {e}")
+            time.sleep(1)
+        except redis.RedisError as e:
+            print(f"Error running fan-out script, cursor not advanced: {e}")
+            time.sleep(1)
+
+
+def benchmark_fanout(redis_client, n_messages=100_000):
+    """
+    Times the client-side pipeline path against the server-side Lua path on
+    throwaway streams. Run it against a local redis-server.
+
+    Args:
+        redis_client: A Redis client object.
+        n_messages: The number of messages to fan out with each path.
+
+    Returns:
+        A dictionary with the messages per second of each path.
+    """
+    source = "bench:{fanout}:source"
+    targets = ["bench:{fanout}:converter", "bench:{fanout}:transcription"]
+    cursor_key = "bench:{fanout}:cursor"
+    group = "bench-fanout"
+    record = {'id': '00000000-0000-4000-8000-000000000000', 'filename': 'ACT_20240101_000001.wav',
+              's3-file-path': 's3://your-bucket-name/2024/01/01/ACT_20240101_000001.wav',
+              'agent_racf': 'R00001', 'calldate': '2024-01-01 10:30:00'}
+
+    redis_client.delete(source, cursor_key, *targets)
+    pipeline = redis_client.pipeline(transaction=False)
+    for i in range(n_messages):
+        pipeline.xadd(source, record)
+        if i % 10000 == 9999:
+            pipeline.execute()
+    pipeline.execute()
+    ensure_consumer_group(redis_client, source, group)
+
+    started = time.perf_counter()
+    while True:
+        messages = read_batch(redis_client, count=FANOUT_BATCH_SIZE, block=1, source_stream=source, group_name=group)
+        if not messages:
+            break
+        fan_out_batch(redis_client, messages, targets, source_stream=source, group_name=group)
+    pipeline_rate = n_messages / (time.perf_counter() - started)
+
+    redis_client.delete(*targets)
+    fanout_script = register_fanout_script(redis_client)
+    started = time.perf_counter()
+    while lua_fan_out_batch(fanout_script, source_stream=source, cursor_key=cursor_key, target_streams=targets)[0]:
+        pass
+    lua_rate = n_messages / (time.perf_counter() - started)
+
+    redis_client.delete(source, cursor_key, *targets)
+    print(f"{n_messages:,} messages to {len(targets)} targets: pipeline {pipeline_rate:,.0f} messages/s, "
+          f"lua {lua_rate:,.0f} messages/s")
+    return {'pipeline_messages_per_second': pipeline_rate, 'lua_messages_per_second': lua_rate}
+
+
+def main():
+    """
+    Main function that connects to Redis and runs the fan-out daemon in
+    FANOUT_MODE until it receives SIGINT or SIGTERM.
+    """
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        routing_table = RoutingTable.from_file(FANOUT_ROUTES_FILE) if FANOUT_ROUTES_FILE else None
+    except (OSError, ValueError) as e:
+        print(f"Invalid routing table {FANOUT_ROUTES_FILE}: {e}")
+        exit(1)
+    redis_client = connect_to_redis()
+
+    if FANOUT_MODE == 'lua' and routing_table is None:
+        print(f"Fanning out {SOURCE_STREAM} to {TARGET_STREAMS} server-side from cursor {FANOUT_CURSOR_KEY}")
+        run_lua_fanout(redis_client)
+    elif routing_table is not None:
+        if FANOUT_MODE == 'lua':
+            print("The Lua fan-out copies to every target; using the pipeline mode to apply the routing table")
+        print(f"{FANOUT_CONSUMER} routing {SOURCE_STREAM} to {routing_table.targets} as group {FANOUT_GROUP}")
+        run_fanout(redis_client, routing_table)
+    else:
+        print(f"{FANOUT_CONSUMER} fanning out {SOURCE_STREAM} to {TARGET_STREAMS} as group {FANOUT_GROUP}")
+        run_fanout(redis_client)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['benchmark']:
+        benchmark_fanout(connect_to_redis(), int(sys.argv[2]) if len(sys.argv) > 2 else 100_000)
+    else:
+        main()
@@ -0,0 +1,208 @@
+import os
+import time
+import signal
+import redis
+from dotenv import load_dotenv
+
+# Load environment variables from a `.env` file
+load_dotenv()
+
+# Redis connection details from environment variables
+REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
+REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+REDIS_PASSWORD = os.getenv('REDIS_PASSWORD')
+
+# Streams to trim and how
+RETENTION_STREAMS = os.getenv(
+    'RETENTION_STREAMS',
+    'gwas-recordings,gwas-converter,gwas-transcription,gwas-collector,collector,collector-enriched,stream_A,stream_B'
+).split(',')
+RETENTION_INTERVAL_SECONDS = int(os.getenv('RETENTION_INTERVAL_SECONDS', 300))
+RETENTION_TRIM_LIMIT = int(os.getenv('RETENTION_TRIM_LIMIT', 10000))
+# Entries younger than this are kept even when acknowledged, for late replays
+RETENTION_KEEP_MS = int(os.getenv('RETENTION_KEEP_MS', 15 * 60 * 1000))
+RETENTION_METRICS_PREFIX = "gwas-retention:metrics"
+
+running = True
+
+
+def stop(signum, frame):
+    """Signal handler that lets the current pass finish before exiting."""
+    global running
+    running = False
+
+
+def connect_to_redis():
+    """
+    Establishes a connection to the Redis server.
+
+    Returns:
+        A Redis client object.
+    """
+    try:
+        redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD, decode_responses=True)
+        redis_client.ping()
+        return redis_client
+    except redis.exceptions.ConnectionError as e:
+        print(f"Error connecting to Redis: {e}")
+        exit(1)
+
+
+def parse_stream_id(stream_id):
+    """
+    Splits a stream ID like '1718000000000-3' into a comparable (ms, seq) tuple.
+    """
+    ms, _, seq = stream_id.partition('-')
+    return int(ms), int(seq or 0)
+
+
+def format_stream_id(parts):
+    """
+    Joins an (ms, seq) tuple back into a stream ID.
+    """
+    return f"{parts[0]}-{parts[1]}"
+
+
+def lowest_unacknowledged_id(redis_client, stream_name):
+    """
+    Finds the lowest stream ID that some consumer may still need.
+
+    For each consumer group this is the oldest pending entry. If nothing is
+    pending, it is the entry right after the group's last delivered ID. The
+    fan-out cursor written by step2_dupls.py's Lua mode counts as one more
+    consumer.
+
+    Args:
+        redis_client: A Redis client object.
+        stream_name: The name of the Redis stream.
+
+    Returns:
+        An (ms, seq) tuple; every entry strictly below it is acknowledged.
+        None if the stream has no consumer groups or cursor, in which case
+        nothing is known to be safe to trim.
+    """
+    positions = []
+    for group in redis_client.xinfo_groups(stream_name):
+        if group['pending']:
+            summary = redis_client.xpending(stream_name, group['name'])
+            positions.append(parse_stream_id(summary['min']))
+        else:
+            ms, seq = parse_stream_id(group['last-delivered-id'])
+            positions.append((ms, seq + 1))
+
+    cursor = redis_client.get(f"{stream_name}:fanout-cursor")
+    if cursor:
+        ms, seq = parse_stream_id(cursor)
+        positions.append((ms, seq + 1))
+
+    return min(positions) if positions else None
+
+
+def trim_stream(redis_client, stream_name, limit=RETENTION_TRIM_LIMIT, keep_ms=RETENTION_KEEP_MS):
+    """
+    Trims acknowledged entries from a stream with approximate XTRIM MINID in
+    batches of at most `limit` entries, so no single call blocks Redis for long.
+
+    Args:
+        redis_client: A Redis client object.
+        stream_name: The name of the Redis stream.
+        limit: The maximum number of entries removed per XTRIM call.
+        keep_ms: Entries younger than this many milliseconds are kept.
+
+    Returns:
+        A dictionary with the stream length before and after, the entries
+        trimmed and the bytes reclaimed (from MEMORY USAGE).
+    """
+    if not redis_client.exists(stream_name):
+        return None
+    threshold = lowest_unacknowledged_id(redis_client, stream_name)
+    if threshold is None:
+        print(f"{stream_name}: no consumer groups, skipping")
+        return None
+    now_ms = int(redis_client.time()[0] * 1000)
+    threshold = min(threshold, (now_ms - keep_ms, 0))
+    min_id = format_stream_id(threshold)
+
+    length_before = redis_client.xlen(stream_name)
+    memory_before = redis_client.memory_usage(stream_name) or 0
+    trimmed = 0
+    while running:
+        removed = redis_client.xtrim(stream_name, minid=min_id, approximate=True, limit=limit)
+        trimmed += removed
+        if not removed:
+            break
+    length_after = redis_client.xlen(stream_name)
+    memory_after = redis_client.memory_usage(stream_name) or 0
+
+    return {
+        'min_id': min_id,
+        'length_before': length_before,
+        'length_after': length_after,
+        'trimmed': trimmed,
+        'bytes_reclaimed': max(memory_before - memory_after, 0),
+        'memory_bytes': memory_after,
+    }
+
+
+def export_metrics(redis_client, stream_name, result):
+    """
+    Prints the result of a trim pass and stores it in a Redis hash, so
+    dashboards can read it from gwas-retention:metrics:<stream>.
+
+    Args:
+        redis_client: A Redis client object.
+        stream_name: The name of the Redis stream.
+        result: The dictionary returned by trim_stream.
+    """
+    print(f"{stream_name}: trimmed {result['trimmed']} entries below {result['min_id']}, "
+          f"length {result['length_before']} -> {result['length_after']}, "
+          f"reclaimed {result['bytes_reclaimed']} bytes")
+    metrics_key = f"{RETENTION_METRICS_PREFIX}:{stream_name}"
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.hset(metrics_key, mapping={
+        'length': result['length_after'],
+        'memory_bytes': result['memory_bytes'],
+        'last_min_id': result['min_id'],
+        'last_run': int(time.time()),
+    })
+    pipeline.hincrby(metrics_key, 'trimmed_total', result['trimmed'])
+    pipeline.hincrby(metrics_key, 'bytes_reclaimed_total', result['bytes_reclaimed'])
+    pipeline.execute()
+
+
+def run_retention(redis_client, streams=RETENTION_STREAMS, interval=RETENTION_INTERVAL_SECONDS):
+    """
+    Trims every stream once per interval until stopped.
+
+    Args:
+        redis_client: A Redis client object.
+        streams: The names of the streams to trim.
+        interval: Seconds between passes.
+    """
+    while running:
+        for stream_name in streams:
+            try:
+                result = trim_stream(redis_client, stream_name)
+                if result is not None:
+                    export_metrics(redis_client, stream_name, result)
+            except redis.RedisError as e:
+                print(f"Error trimming stream {stream_name}: {e}")
+        deadline = time.monotonic() + interval
+        while running and time.monotonic() < deadline:
+            time.sleep(1)
+
+
+def main():
+    """
+    Main function that connects to Redis and runs the retention manager until
+    it receives SIGINT or SIGTERM.
+    """
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    redis_client = connect_to_redis()
+    print(f"Trimming {RETENTION_STREAMS} every {RETENTION_INTERVAL_SECONDS} s")
+    run_retention(redis_client)
+
+
+if __name__ == "__main__":
+    main()
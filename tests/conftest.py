@@ -0,0 +1,32 @@
+import re
+import types
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_latest_variant(filename, module_name):
+    """
+    Imports the last variant of a snippet file as a module.
+
+    Several files keep older variants above the current one, separated by
+    lines of '=' signs, so they cannot be imported directly.
+    """
+    path = REPO_ROOT / filename
+    variant = re.split(r'(?m)^=+\s*$', path.read_text())[-1]
+    module = types.ModuleType(module_name)
+    module.__file__ = str(path)
+    exec(compile(variant, str(path), 'exec'), module.__dict__)
+    return module
+
+
+@pytest.fixture(scope='session')
+def db_connect():
+    return load_latest_variant('db-connect.py', 'db_connect')
+
+
+@pytest.fixture(scope='session')
+def collect_redis():
+    return load_latest_variant('collect redis', 'collect_redis')
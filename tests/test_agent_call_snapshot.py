@@ -0,0 +1,129 @@
+import sqlite3
+
+import pytest
+
+DAY = '2024-06-01'
+
+
+@pytest.fixture
+def database(tmp_path):
+    """A SQLite stand-in for agentTerminationCall, case-insensitive like SQL Server's collation."""
+    path = str(tmp_path / 'agent_calls.sqlite')
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE agentTerminationCall (agentRACF TEXT COLLATE NOCASE, calldate TEXT, RCID TEXT, "
+        "additional_field1 TEXT, additional_field2 TEXT, modified INTEGER)"
+    )
+    conn.executemany(
+        "INSERT INTO agentTerminationCall VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            ('AGENT1', f"{DAY} 10:00:00", 'R1', 'a', 'b', 1),
+            ('AGENT2', f"{DAY} 11:30:00", 'R2', 'c', None, 1),
+            ('AGENT1', '2024-06-02 09:00:00', 'R3', None, None, 1),
+        ],
+    )
+    conn.commit()
+    yield conn, path
+    conn.close()
+
+
+@pytest.fixture
+def snapshot(db_connect, database):
+    def make(**options):
+        _, path = database
+        pool = db_connect.JdbcConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False), size=1)
+        options.setdefault('fallback', False)
+        options.setdefault('refresh_seconds', 3600)
+        return db_connect.AgentCallSnapshot(pool, **options)
+    return make
+
+
+def test_loads_a_day_in_one_query_and_serves_lookups_from_memory(snapshot):
+    agent_calls = snapshot(change_column='modified')
+
+    found = agent_calls.lookup([('AGENT1', f"{DAY} 10:00:00"), ('AGENT2', f"{DAY} 11:30:00")])
+
+    assert found == {
+        ('AGENT1', f"{DAY} 10:00:00"): ('R1', {'additional_field1': 'a', 'additional_field2': 'b'}),
+        ('AGENT2', f"{DAY} 11:30:00"): ('R2', {'additional_field1': 'c', 'additional_field2': None}),
+    }
+    stats = agent_calls.stats()
+    assert stats['days'] == [DAY]
+    assert stats['indexed_rows'] == 2
+    assert stats['snapshot_hits'] == 2
+
+
+def test_lookup_ignores_case_and_trailing_spaces_like_sql_server(snapshot):
+    agent_calls = snapshot()
+
+    found = agent_calls.lookup([('agent1 ', f"{DAY} 10:00:00")])
+
+    assert found == {('agent1 ', f"{DAY} 10:00:00"): ('R1', {'additional_field1': 'a', 'additional_field2': 'b'})}
+
+
+def test_refresh_applies_updated_rows(snapshot, database):
+    conn, _ = database
+    agent_calls = snapshot(change_column='modified')
+    key = ('AGENT1', f"{DAY} 10:00:00")
+    assert agent_calls.lookup([key])[key][0] == 'R1'
+
+    conn.execute("UPDATE agentTerminationCall SET RCID = 'R1-NEW', modified = 2 WHERE RCID = 'R1'")
+    conn.commit()
+    agent_calls.refresh()
+
+    assert agent_calls.lookup([key])[key][0] == 'R1-NEW'
+
+
+def test_refresh_picks_up_new_rows(snapshot, database):
+    conn, _ = database
+    agent_calls = snapshot()
+    key = ('AGENT3', f"{DAY} 12:00:00")
+    assert agent_calls.lookup([key]) == {}
+
+    conn.execute("INSERT INTO agentTerminationCall VALUES ('AGENT3', ?, 'R4', NULL, NULL, 1)", (key[1],))
+    conn.commit()
+    agent_calls.refresh()
+
+    assert agent_calls.lookup([key])[key][0] == 'R4'
+
+
+def test_missing_keys_are_not_queried_without_fallback(snapshot):
+    agent_calls = snapshot()
+
+    assert agent_calls.lookup([('NOBODY', f"{DAY} 10:00:00")]) == {}
+
+    stats = agent_calls.stats()
+    assert stats['misses'] == 1
+    assert stats['fallback_queries'] == 0
+
+
+def test_keeps_at_most_max_days(snapshot):
+    agent_calls = snapshot(max_days=1)
+
+    agent_calls.lookup([('AGENT1', f"{DAY} 10:00:00")])
+    found = agent_calls.lookup([('AGENT1', '2024-06-02 09:00:00')])
+
+    assert found[('AGENT1', '2024-06-02 09:00:00')][0] == 'R3'
+    assert agent_calls.stats()['days'] == ['2024-06-02']
+
+
+def test_batch_spanning_more_than_max_days_reads_the_overflow_with_lookup_rcids(snapshot, db_connect, monkeypatch):
+    queried = []
+
+    def lookup_rcids(conn, keys):
+        queried.extend(keys)
+        return {key: ('R3', {}) for key in keys}
+
+    # SQLite has no VALUES derived tables, so the SQL Server lookup is replaced
+    monkeypatch.setattr(db_connect, 'lookup_rcids', lookup_rcids)
+    agent_calls = snapshot(max_days=1)
+
+    found = agent_calls.lookup([('AGENT1', f"{DAY} 10:00:00"), ('AGENT1', '2024-06-02 09:00:00')])
+
+    assert found[('AGENT1', f"{DAY} 10:00:00")][0] == 'R1'
+    assert found[('AGENT1', '2024-06-02 09:00:00')][0] == 'R3'
+    assert queried == [('AGENT1', '2024-06-02 09:00:00')]
+    stats = agent_calls.stats()
+    assert stats['days'] == [DAY]
+    assert stats['days_loaded'] == 1
+    assert stats['overflow_keys'] == 1
@@ -0,0 +1,41 @@
+class FakeElasticsearch:
+    """Answers mget from a dict of stored sources keyed by (index, _id)."""
+
+    def __init__(self, stored):
+        self.stored = stored
+
+    def mget(self, index, ids, source_includes):
+        return {'docs': [
+            {'_index': index, '_id': doc_id, 'found': (index, doc_id) in self.stored,
+             '_source': {field: value for field, value in self.stored.get((index, doc_id), {}).items()
+                         if field in source_includes}}
+            for doc_id in ids
+        ]}
+
+
+def test_completed_flag_matches_painless_script(collect_redis):
+    mismatches = [(source, expected, collect_redis.completed_flag(source))
+                  for source, expected in collect_redis.COMPLETED_FLAG_PARITY_CASES
+                  if collect_redis.completed_flag(source) != expected]
+    assert mismatches == []
+
+
+def test_verify_completed_flag_parity_without_elasticsearch(collect_redis):
+    assert collect_redis.verify_completed_flag_parity() is True
+
+
+def test_stamp_completed_flags_reads_missing_fields_from_stored_documents(collect_redis):
+    es_client = FakeElasticsearch({('fantom-2024.06.01', 'call1'): {'_a1': 'x', '_b1': 'y'}})
+    indexer = collect_redis.BulkIndexer(es_client)
+    pending = [
+        ([], indexer.update_action('fantom-2024.06.01', 'call1', {'_c1': 'z'})),
+        ([], indexer.update_action('fantom-2024.06.01', 'call2', {'_c1': 'z'})),
+        ([], indexer.update_action('fantom-2024.06.01', 'call3', {'_a1': 'x', '_b1': 'y', '_c1': None})),
+    ]
+
+    indexer.stamp_completed_flags(pending)
+
+    assert [action['doc']['completed_flag'] for _, action in pending] == ['Y', 'N', 'N']
+    assert all('updated_at' in action['doc'] for _, action in pending)
+    # call3 carries every flag field and needs no lookup
+    assert indexer.counters['flag_lookups'] == 2